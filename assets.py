@@ -0,0 +1,167 @@
+# assets.py — FICHIERS STATIQUES EMPREINTÉS ET PRÉCOMPRESSÉS
+#
+# `flask build-assets` (au démarrage du dyno web, voir Procfile) copie chaque
+# fichier de static/ (hors uploads/) vers static/dist/ sous un nom qui
+# contient le hash de son contenu (css/style.3fa9c1d2e4b5.css), avec ses
+# versions .gz et .br quand elles sont plus petites, et écrit
+# static/dist/manifest.json.
+#
+# url_for('static', filename='css/style.css') renvoie alors l'URL empreintée :
+# le contenu d'une telle URL ne change jamais, elle est servie avec
+# « Cache-Control: immutable » et le navigateur ne la redemande plus.
+# Sans manifeste (développement), rien ne change.
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import tempfile
+
+from flask import current_app, request, send_file
+
+try:
+    import brotli
+except ImportError:  # Brotli absent : gzip seulement
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+SKIPPED_DIRS = {'uploads', DIST_DIR}  # Fichiers des utilisateurs : servis à part
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.webmanifest', '.ico', '.txt', '.map'}
+MIN_GAIN = 0.9  # Version compressée gardée si elle fait moins de 90 % de l'original
+ONE_YEAR = 31536000
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]  # Ordre de préférence
+
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+
+
+def _fingerprinted(relative, digest):
+    stem, ext = os.path.splitext(relative)
+    return f'{stem}.{digest[:12]}{ext}'
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read_manifest(dist):
+    try:
+        with open(os.path.join(dist, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)['files']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def build(static_folder):
+    """Construit static/dist/ et son manifeste ; renvoie le manifeste."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    previous = _read_manifest(dist)
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        if dirpath == static_folder:
+            dirnames[:] = [d for d in dirnames if d not in SKIPPED_DIRS]
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            relative = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            target = _fingerprinted(relative, digest)
+            target_path = os.path.join(dist, target)
+            _write_atomic(target_path, data)
+
+            encodings = []
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    variants['br'] = brotli.compress(data, quality=11)
+                for encoding, suffix in ENCODINGS:
+                    compressed = variants.get(encoding)
+                    if compressed is not None and len(compressed) < len(data) * MIN_GAIN:
+                        _write_atomic(target_path + suffix, compressed)
+                        encodings.append(encoding)
+            files[relative] = {'path': target, 'digest': digest[:12], 'encodings': encodings}
+
+    manifest = {'files': files}
+    _write_atomic(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode())
+    _remove_stale(dist, [files, previous])
+    return manifest
+
+
+def _remove_stale(dist, manifests):
+    # On garde le build précédent : les pages déjà ouvertes y font encore référence
+    keep = {MANIFEST}
+    for entry in (entry for files in manifests for entry in files.values()):
+        keep.add(entry['path'])
+        keep.update(entry['path'] + suffix for encoding, suffix in ENCODINGS if encoding in entry['encodings'])
+    for dirpath, dirnames, filenames in os.walk(dist, topdown=False):
+        for name in filenames:
+            relative = os.path.relpath(os.path.join(dirpath, name), dist).replace(os.sep, '/')
+            if relative not in keep:
+                os.remove(os.path.join(dirpath, name))
+        if dirpath != dist and not os.listdir(dirpath):
+            shutil.rmtree(dirpath, ignore_errors=True)
+
+
+class AssetManifest:
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.dist = os.path.join(static_folder, DIST_DIR)
+        self._files = None     # nom logique → entrée du manifeste
+        self._served = None    # nom empreinté → entrée du manifeste
+
+    def _load(self):
+        # Lu une fois par processus : un nouveau build arrive avec un redémarrage
+        if self._files is None:
+            self._files = _read_manifest(self.dist)
+            self._served = {entry['path']: entry for entry in self._files.values()}
+        return self._files
+
+    def url_defaults(self, endpoint, values):
+        """Branché sur app.url_defaults : url_for('static', …) → fichier empreinté."""
+        if endpoint != 'static' or 'filename' not in values:
+            return
+        entry = self._load().get(values['filename'])
+        if entry is not None:
+            values['filename'] = f"{DIST_DIR}/{entry['path']}"
+
+    def serve(self, filename):
+        """Remplace la vue `static` : fichiers empreintés compressés et immuables."""
+        prefix = DIST_DIR + '/'
+        self._load()
+        entry = self._served.get(filename[len(prefix):]) if filename.startswith(prefix) else None
+        if entry is None:
+            return current_app.send_static_file(filename)
+
+        path = os.path.join(self.dist, entry['path'])
+        encoding = self._negotiate(entry['encodings'])
+        mimetype = mimetypes.guess_type(entry['path'])[0] or 'application/octet-stream'
+        response = send_file(path + dict(ENCODINGS)[encoding] if encoding else path,
+                             mimetype=mimetype, conditional=True,
+                             etag=f"{entry['digest']}-{encoding or 'identity'}", max_age=ONE_YEAR)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry['encodings']:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    @staticmethod
+    def _negotiate(available):
+        accepted = request.accept_encodings
+        for encoding, _ in ENCODINGS:
+            if encoding in available and accepted[encoding] > 0:
+                return encoding
+        return None
+
+    def init_app(self, app):
+        app.url_defaults(self.url_defaults)
+        app.view_functions['static'] = self.serve
@@ -0,0 +1,93 @@
+# backpressure.py — CLIENTS LENTS : FILES DE SORTIE BORNÉES
+#
+# Engine.IO garde pour chaque socket une file des paquets pas encore écrits.
+# Sur un mauvais réseau mobile elle grossit sans limite. Une green thread
+# parcourt les sockets de ce processus toutes les `interval` secondes ; au-delà
+# de `max_queue` paquets en attente :
+#   - 'drop'       : les messages de chat en attente sont abandonnés et le
+#                    client reçoit `resync` (il rattrape via sync_messages) ;
+#                    présence, suppressions et autres événements sont gardés
+#   - 'disconnect' : la socket est fermée (le client se reconnecte et rattrape)
+
+from engineio import packet as eio_packet
+from socketio import packet as sio_packet
+
+from wire import COMPACT_EVENT
+
+# Seuls les messages de chat se rattrapent avec sync_messages
+DROPPABLE_EVENTS = {'receive_message', COMPACT_EVENT}
+
+
+class SlowConsumerMonitor:
+
+    def __init__(self, socketio, max_queue=500, policy='drop', interval=1.0, on_action=None):
+        if policy not in ('drop', 'disconnect'):
+            raise ValueError(f"Politique inconnue pour les clients lents : {policy}")
+        self.socketio = socketio
+        self.max_queue = max_queue
+        self.policy = policy
+        self.interval = interval
+        self.on_action = on_action  # on_action(policy, dropped)
+        self.stats = {'checks': 0, 'dropped_packets': 0, 'drops': 0, 'disconnects': 0, 'max_seen': 0}
+        self._started = False
+
+    def start(self):
+        if not self._started and self.max_queue > 0:
+            self._started = True
+            self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Erreur surveillance clients lents : {e}")
+
+    def check(self):
+        self.stats['checks'] += 1
+        server = self.socketio.server
+        for eio_sid, socket in list(server.eio.sockets.items()):
+            queued = socket.queue.qsize()
+            self.stats['max_seen'] = max(self.stats['max_seen'], queued)
+            if queued <= self.max_queue:
+                continue
+            if self.policy == 'disconnect':
+                self.stats['disconnects'] += 1
+                socket.close(wait=False, abort=True)
+                if self.on_action:
+                    self.on_action('disconnect', queued)
+                continue
+            dropped = self._drop_messages(socket)
+            self.stats['drops'] += 1
+            self.stats['dropped_packets'] += dropped
+            sid = server.manager.sid_from_eio_sid(eio_sid, '/')
+            if sid:
+                self.socketio.emit('resync', {'dropped': dropped}, to=sid)
+            if self.on_action:
+                self.on_action('drop', dropped)
+
+    def _drop_messages(self, socket):
+        # Les paquets de contrôle (ping, fermeture…) et les autres événements sont remis dans la file
+        kept, dropped = [], 0
+        while not socket.queue.empty():
+            pkt = socket.queue.get(block=False)
+            socket.queue.task_done()
+            if self._is_chat_message(pkt):
+                dropped += 1
+            else:
+                kept.append(pkt)
+        for pkt in kept:
+            socket.queue.put(pkt)
+        return dropped
+
+    @staticmethod
+    def _is_chat_message(pkt):
+        if pkt is None or pkt.packet_type != eio_packet.MESSAGE or not isinstance(pkt.data, str):
+            return False  # Pièces jointes binaires : gardées avec leur en-tête
+        try:
+            message = sio_packet.Packet(encoded_packet=pkt.data)
+        except Exception:
+            return False
+        return message.packet_type == sio_packet.EVENT and bool(message.data) \
+            and message.data[0] in DROPPABLE_EVENTS
@@ -0,0 +1,163 @@
+# bench/cold_start.py — DÉMARRAGE À FROID D'UN WORKER
+#
+# Ce que paie chaque redémarrage de worker ou nouvelle instance (autoscaling) :
+#   - import   : `import app` dans un processus neuf (ce que fait gunicorn)
+#   - prêt     : lancement du processus → première réponse HTTP 200
+#   - 1er chat : premier GET /students/chat connecté, dans le processus
+#                (compilation de index.html, tampon des messages récents)
+#   - chat     : le même GET une fois chaud
+# Mesuré avec le cache de bytecode Jinja vide puis rempli (`flask warm-templates`).
+# --baseline REF mesure aussi une autre révision (git worktree temporaire).
+#
+#   python bench/cold_start.py --runs 5 --baseline HEAD~1
+
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'coldstart123'
+
+SIGN_UP_SNIPPET = """
+import sys
+sys.path.insert(0, '.')
+import app
+app.app.test_client().post('/register', data={'username': 'cold', 'number': '0600000000',
+                                              'password': '%s', 'confirm_password': '%s'})
+""" % (PASSWORD, PASSWORD)
+
+
+IMPORT_SNIPPET = """
+import sys, time
+sys.path.insert(0, '.')
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+client = app.app.test_client()
+client.post('/login', data={'username': 'cold', 'password': '%s'})
+timings = []
+for _ in range(2):
+    started = time.perf_counter()
+    assert client.get('/students/chat').status_code == 200
+    timings.append((time.perf_counter() - started) * 1000)
+print(imported, *timings)
+""" % PASSWORD
+
+# Comme gunicorn : le module est importé, pas exécuté (__main__ n'est pas lancé)
+SERVE_SNIPPET = """
+import os, sys
+sys.path.insert(0, '.')
+import app
+app.socketio.run(app.app, host='127.0.0.1', port=int(os.environ['PORT']), debug=False)
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare_database(root, env):
+    # Schéma et un compte, hors mesure (les révisions sans `flask init-db` créent le schéma à l'import)
+    subprocess.run([sys.executable, '-m', 'flask', 'init-db'], cwd=root, env=env, capture_output=True)
+    subprocess.run([sys.executable, '-c', SIGN_UP_SNIPPET], cwd=root, env=env, check=True, capture_output=True)
+
+
+def import_and_render(root, env):
+    """(secondes d'import, ms du 1er chat, ms du chat chaud)."""
+    out = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=root, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    imported, first_chat, chat = out.strip().splitlines()[-1].split()
+    return float(imported), float(first_chat), float(chat)
+
+
+def boot(root, env):
+    """Secondes entre le lancement du serveur et sa première réponse."""
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', SERVE_SNIPPET], cwd=root, env=dict(env, PORT=str(port)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Le serveur de {root} s'est arrêté")
+            try:
+                if requests.get(base_url + '/login', timeout=1).status_code == 200:
+                    break
+            except requests.ConnectionError:
+                time.sleep(0.01)
+        return time.perf_counter() - started
+    finally:
+        process.kill()
+        process.wait()
+
+
+def reset_template_cache(root, env, cache_dir, warm_cache):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    if warm_cache:
+        subprocess.run([sys.executable, '-m', 'flask', 'warm-templates'], cwd=root, env=env,
+                       check=True, capture_output=True)
+
+
+def measure(label, root, runs, cache_dir=None, warm_cache=False):
+    workdir = tempfile.mkdtemp(prefix='cold_start-')
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(workdir, 'chat.db'),
+               FLASK_APP='app', MESSAGE_RETENTION_DAYS='0', PYTHONWARNINGS='ignore')
+    env.pop('SOCKETIO_MESSAGE_QUEUE', None)
+    if cache_dir:
+        env['TEMPLATE_CACHE_DIR'] = cache_dir
+    prepare_database(root, env)
+
+    results = {'import': [], 'ready': [], 'first_chat': [], 'chat': []}
+    for _ in range(runs):
+        if cache_dir:
+            reset_template_cache(root, env, cache_dir, warm_cache)
+        imported, first_chat, chat = import_and_render(root, env)
+        results['import'].append(imported)
+        results['first_chat'].append(first_chat)
+        results['chat'].append(chat)
+        if cache_dir:
+            reset_template_cache(root, env, cache_dir, warm_cache)
+        results['ready'].append(boot(root, env))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    median = {name: statistics.median(values) for name, values in results.items()}
+    print(f"{label:<28}{median['import'] * 1000:>10.0f}{median['ready'] * 1000:>10.0f}"
+          f"{median['first_chat']:>12.1f}{median['chat']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--baseline', help='révision git à comparer (ex. HEAD~1)')
+    args = parser.parse_args()
+
+    print(f"Médianes sur {args.runs} démarrages (ms)\n")
+    print(f"{'':<28}{'import':>10}{'prêt':>10}{'1er chat':>12}{'chat':>10}")
+    cache_dir = tempfile.mkdtemp(prefix='jinja_cache-')
+    measure('actuel, cache Jinja vide', ROOT, args.runs, cache_dir=cache_dir)
+    measure('actuel, cache Jinja rempli', ROOT, args.runs, cache_dir=cache_dir, warm_cache=True)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if args.baseline:
+        worktree = tempfile.mkdtemp(prefix='cold_start-baseline-')
+        subprocess.run(['git', 'worktree', 'add', '--detach', worktree, args.baseline], cwd=ROOT, check=True,
+                       capture_output=True)
+        try:
+            measure(args.baseline, worktree, args.runs)
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', worktree], cwd=ROOT, capture_output=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# bench/db_layer.py — ROUTAGE VERS LA RÉPLIQUE ET I/O POSTGRESQL COOPÉRATIVES
+#
+# 1. Routage : primaire et « réplique » sont deux bases distinctes (non
+#    répliquées), même schéma, un message différent dans chacune. Chaque route
+#    est appelée une fois ; on compte les requêtes SQL reçues par chaque moteur.
+# 2. PostgreSQL seulement : --clients green threads lancent chacune
+#    SELECT pg_sleep(--sleep). Avec le pilote bloquant, elles passent l'une
+#    après l'autre et le hub est figé (le « tic » toutes les 10 ms ne tourne
+#    plus) ; avec le wait callback de database.py, elles se recouvrent.
+#
+#   python bench/db_layer.py                       (deux bases SQLite temporaires)
+#   DATABASE_URL=postgresql://localhost/chat REPLICA_DATABASE_URL=postgresql://localhost/chat_replica \
+#   DATABASE_SSLMODE=disable python bench/db_layer.py --clients 10 --sleep 0.2
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse  # noqa: E402
+import collections  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+import warnings  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.simplefilter('ignore')
+
+from sqlalchemy import event, text  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+import channels  # noqa: E402
+import database  # noqa: E402
+import extensions as ext  # noqa: E402
+from commands import init_db  # noqa: E402
+from factory import create_app  # noqa: E402
+from models import db, User, Message  # noqa: E402
+
+PASSWORD = 'dblayer123'
+ROUTES = ['/students/chat', '/api/messages/history', '/api/messages/search?q=depuis', '/chatting/stats',
+          '/admin', '/admin/api/users', '/admin/api/messages', '/students/profile']
+
+queries = collections.Counter()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count(conn, cursor, statement, parameters, context, executemany):
+    queries[getattr(conn.engine, '_metrics_name', '?')] += 1
+
+
+def seed(url, label, workdir):
+    """Schéma, compte admin (id 1) et un message qui dit de quelle base il vient."""
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'REPLICA_DATABASE_URL': None, 'PASSWORD_WORKERS': 0,
+                      'TEMPLATE_CACHE_DIR': os.path.join(workdir, 'jinja_cache')})
+    with app.app_context():
+        init_db()
+        if db.session.get(User, 1) is None:
+            user = User(id=1, username='admin', number='0600000001')
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.commit()
+        db.session.add(Message(username='admin', user_id=1, message=f'depuis la base {label}',
+                               channel_id=channels.default_channel_id()))
+        db.session.commit()
+    ext.message_writer.shutdown()
+
+
+def routing(primary_url, replica_url, workdir):
+    seed(primary_url, 'primaire', workdir)
+    seed(replica_url, 'réplique', workdir)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': primary_url, 'REPLICA_DATABASE_URL': replica_url,
+                      'PASSWORD_WORKERS': 0, 'TEMPLATE_CACHE_DIR': os.path.join(workdir, 'jinja_cache')})
+    client = app.test_client()
+
+    print(f"{'route':<34}{'primaire':>10}{'réplique':>10}   message affiché")
+    queries.clear()
+    client.post('/login', data={'username': 'admin', 'password': PASSWORD})
+    print(f"{'POST /login':<34}{queries['primary']:>10}{queries['replica']:>10}")
+    for route in ROUTES:
+        queries.clear()
+        body = client.get(route).get_data(as_text=True)
+        # (jsonify échappe les accents : « r\u00e9plique »)
+        source = 'primaire' if 'depuis la base primaire' in body else \
+            'réplique' if 'depuis la base r' in body else ''
+        print(f"{route:<34}{queries['primary']:>10}{queries['replica']:>10}   {source}")
+    ext.message_writer.shutdown()
+    return app
+
+
+def cooperative(app, clients, sleep):
+    from psycopg2 import extensions
+
+    print(f"\n{clients} × SELECT pg_sleep({sleep}) en green threads\n")
+    print(f"{'pilote':<28}{'durée (s)':>12}{'tics du hub':>14}")
+    for label, callback in (('bloquant', None), ('coopératif (database.py)', database.eventlet_wait_callback)):
+        extensions.set_wait_callback(callback)
+        with app.app_context():
+            db.engine.dispose()  # Nouvelles connexions, dans le mode choisi
+        ticks = [0, True]
+
+        def ticker():
+            while ticks[1]:
+                eventlet.sleep(0.01)
+                ticks[0] += 1
+
+        def query():
+            with app.app_context():
+                db.session.execute(text('SELECT pg_sleep(:s)'), {'s': sleep})
+                db.session.remove()
+
+        tick_thread = eventlet.spawn(ticker)
+        started = time.perf_counter()
+        pool = eventlet.GreenPool(clients)
+        for _ in range(clients):
+            pool.spawn(query)
+        pool.waitall()
+        elapsed = time.perf_counter() - started
+        ticks[1] = False
+        tick_thread.wait()
+        print(f"{label:<28}{elapsed:>12.2f}{ticks[0]:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--sleep', type=float, default=0.2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='db_layer-')
+    primary_url = database.normalize_url(os.environ.get('DATABASE_URL')) or \
+        'sqlite:///' + os.path.join(workdir, 'primary.db')
+    replica_url = database.normalize_url(os.environ.get('REPLICA_DATABASE_URL')) or \
+        'sqlite:///' + os.path.join(workdir, 'replica.db')
+
+    app = routing(primary_url, replica_url, workdir)
+    if 'postgresql' in primary_url:
+        cooperative(app, args.clients, args.sleep)
+    else:
+        print("\n(I/O coopératives : mesurées seulement avec DATABASE_URL=postgresql://…)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# bench/fanout.py — CPU ET OCTETS D'UNE DIFFUSION VERS N SOCKETS
+#
+# Un vrai socketio.Server dont les N sockets sont fictives : chaque paquet
+# Engine.IO « envoyé » est encodé comme le ferait le transport websocket et
+# ses octets sont comptés. Compare :
+#   - per-socket : un emit par destinataire (réencodage à chaque fois)
+#   - json       : emit vers le salon, dict complet (format par défaut)
+#   - compact    : emit vers le salon, tableau de wire.py sans pseudo/avatar
+#   - msgpack    : compact empaqueté en binaire (si le module est installé)
+#
+#   python bench/fanout.py --recipients 1000 --broadcasts 200
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import socketio  # noqa: E402
+
+from wire import compact_message  # noqa: E402
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MESSAGE = {
+    'id': 123456,
+    'username': 'etudiant_informatique',
+    'message': 'Quelqu’un a les notes du cours de physique de ce matin ? Merci !',
+    'timestamp': '14:32:07',
+    'user_id': 4242,
+    'file_url': None,
+    'file_preview': None,
+    'avatar': '/media/thumb/uploads/files/3f/a9/3fa9c1d2e4b5a6978812345678901234567890abcdef1234567890abcdef12.png',
+    'is_private': False,
+    'recipient_id': None,
+    'recipient_username': None,
+}
+
+
+class CountingServer(socketio.Server):
+    """Compte les octets au lieu de les écrire sur des sockets."""
+
+    bytes_sent = 0
+    frames = 0
+
+    def _send_eio_packet(self, eio_sid, eio_pkt):
+        encoded = eio_pkt.encode()
+        self.bytes_sent += len(encoded)
+        self.frames += 1
+
+
+def build_server(recipients):
+    server = CountingServer(async_mode='threading')
+    sids = []
+    for i in range(recipients):
+        sid = server.manager.connect(f'eio{i}', '/')
+        server.manager.enter_room(sid, '/', 'wire:all')
+        sids.append(sid)
+    return server, sids
+
+
+def run(server, sids, mode, broadcasts):
+    server.bytes_sent = server.frames = 0
+    started = time.process_time()
+    for _ in range(broadcasts):
+        if mode == 'per-socket':
+            for sid in sids:
+                server.emit('receive_message', dict(MESSAGE), to=sid)
+        elif mode == 'json':
+            server.emit('receive_message', MESSAGE, to='wire:all')
+        elif mode == 'compact':
+            server.emit('m', compact_message(MESSAGE), to='wire:all')
+        elif mode == 'msgpack':
+            server.emit('m', msgpack.packb(compact_message(MESSAGE)), to='wire:all')
+    cpu = time.process_time() - started
+    return cpu / broadcasts * 1000, server.bytes_sent / broadcasts, server.frames / broadcasts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipients', type=int, default=1000)
+    parser.add_argument('--broadcasts', type=int, default=200)
+    args = parser.parse_args()
+
+    server, sids = build_server(args.recipients)
+    modes = ['per-socket', 'json', 'compact'] + (['msgpack'] if msgpack else [])
+
+    print(f"Diffusion d'un message vers {args.recipients} sockets ({args.broadcasts} essais)\n")
+    print(f"{'format':<12}{'CPU ms':>10}{'octets':>12}{'trames':>9}{'octets/socket':>15}")
+    for mode in modes:
+        cpu_ms, sent, frames = run(server, sids, mode, args.broadcasts)
+        print(f"{mode:<12}{cpu_ms:>10.2f}{sent:>12.0f}{frames:>9.0f}{sent / args.recipients:>15.1f}")
+    if not msgpack:
+        print("\n(msgpack non installé : format binaire non mesuré)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# bench/fragments_bench.py — RENDUS PAR SECONDE DU FIL DE MESSAGES
+#
+# Sur une base SQLite jetable avec --messages messages (dont un sur cinq
+# avec une image, un sur dix avec un fichier), compare :
+#   - boucle      : l'ancien bloc {% for msg in messages %} de index.html
+#   - cache froid : fragments rendus puis concaténés, cache vidé à chaque fois
+#   - cache chaud : fragments déjà rendus, concaténation seule
+# puis la page /students/chat complète, sans puis avec le cache.
+#
+#   python bench/fragments_bench.py --messages 50 --seconds 2
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.simplefilter('ignore')
+
+import channels  # noqa: E402
+import extensions as ext  # noqa: E402
+from commands import init_db  # noqa: E402
+from factory import create_app  # noqa: E402
+from fragments import TEMPLATE  # noqa: E402
+from models import db, User, Message, serialize_messages  # noqa: E402
+
+PASSWORD = 'fragments123'
+
+
+def rate(fn, seconds):
+    """Appels par seconde de fn() pendant `seconds` secondes."""
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def seed(app, count):
+    with app.app_context():
+        init_db()
+        user = User(username='bench', number='0612345678', avatar='/static/img/1_c4746405.png')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        channel_id = channels.default_channel_id()
+        for i in range(count):
+            file_url = None
+            if i % 5 == 0:
+                file_url = f'/static/uploads/files/ab/cd/{i:064x}.png'
+            elif i % 10 == 1:
+                file_url = f'/static/uploads/files/ab/cd/{i:064x}.pdf'
+            db.session.add(Message(username=user.username, user_id=user.id, file_url=file_url, channel_id=channel_id,
+                                   message=f'Message numéro {i} <b>échappé</b> avec un peu de texte.'))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='fragments-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'chat.db'),
+        'PASSWORD_WORKERS': 0,
+        'TEMPLATE_CACHE_DIR': os.path.join(workdir, 'jinja_cache'),
+    })
+    seed(app, args.messages)
+
+    with app.test_request_context():
+        messages = serialize_messages(Message.query.order_by(Message.id).all())
+        source = app.jinja_env.loader.get_source(app.jinja_env, TEMPLATE)[0]
+        body = source.split('{% macro message(msg) %}')[1].split('{% endmacro %}')[0]
+        loop = app.jinja_env.from_string('{% for msg in messages %}' + body + '{% endfor %}')
+        fragments = ext.fragments
+
+        def cold():
+            fragments._entries.clear()
+            return fragments.render_all(messages)
+
+        assert loop.render(messages=messages).split() == str(cold()).split()
+
+        print(f"Fil de {len(messages)} messages, rendus par seconde\n")
+        baseline = rate(lambda: loop.render(messages=messages), args.seconds)
+        print(f"{'boucle (avant)':<24}{baseline:>10.0f}")
+        print(f"{'cache froid':<24}{rate(cold, args.seconds):>10.0f}")
+        fragments.render_all(messages)
+        warm = rate(lambda: fragments.render_all(messages), args.seconds)
+        print(f"{'cache chaud':<24}{warm:>10.0f}   ×{warm / baseline:.1f}")
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': PASSWORD})
+
+    def page():
+        assert client.get('/students/chat').status_code == 200
+
+    print("\nPage /students/chat complète, rendus par seconde\n")
+    ext.fragments.maxsize = 0
+    ext.fragments._entries.clear()
+    without = rate(page, args.seconds)
+    print(f"{'sans cache':<24}{without:>10.0f}")
+    ext.fragments.maxsize = app.config['FRAGMENT_CACHE_SIZE']
+    page()
+    cached = rate(page, args.seconds)
+    print(f"{'avec cache':<24}{cached:>10.0f}   ×{cached / without:.1f}")
+    ext.message_writer.shutdown()
+
+
+if __name__ == '__main__':
+    main()
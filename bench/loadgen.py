@@ -0,0 +1,382 @@
+# bench/loadgen.py — CHARGE SOCKET.IO DE BOUT EN BOUT SUR UN SERVEUR LOCAL
+#
+# Lance `python app.py` sur une base SQLite jetable, inscrit et connecte
+# --clients navigateurs simulés (HTTP + Socket.IO en websocket), puis envoie
+# --rate messages/s pendant --duration secondes depuis --senders d'entre eux.
+#
+# Mesures :
+#   - latence de diffusion : envoi de `send_message` → chaque `receive_message`
+#   - débit (messages envoyés / livraisons par seconde), pertes
+#   - mémoire du serveur par connexion (RSS, Linux)
+#   - temps base : durée des lots d'insertion du writer, délai de persistance
+#   - côté serveur (/metrics) : durée du gestionnaire send_message, requêtes
+#     SQL par message, attente du pool, taille moyenne des diffusions
+#
+# Le premier compte inscrit reçoit l'id 1 (admin) : il lit /admin/cache_stats.
+# Les résultats sont écrits dans bench/results/<commit>-<date>.json ;
+# --compare A.json B.json les met côte à côte.
+#
+#   pip install "python-socketio[client]"
+#   python bench/loadgen.py --clients 200 --rate 50 --duration 20
+#   python bench/loadgen.py --compare bench/results/a.json bench/results/b.json
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import socket  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+from datetime import datetime  # noqa: E402
+
+import requests  # noqa: E402
+import socketio  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'bench', 'results')
+PASSWORD = 'loadtest123'
+
+
+# ------------------------------------------------------------------ serveur
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, db_path, log_path, extra_env):
+    # Les limites de débit par client fausseraient la mesure : levées sauf --env contraire
+    env = dict(os.environ, PORT=str(port), DATABASE_URL='sqlite:///' + db_path,
+               RATE_LIMIT_MESSAGES_SID='1000000/1000000', RATE_LIMIT_MESSAGES_USER='1000000/1000000')
+    env.update(extra_env)
+    env.pop('SOCKETIO_MESSAGE_QUEUE', None)
+    log = open(log_path, 'w')
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=ROOT, env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Le serveur s'est arrêté, voir {log_path}")
+        try:
+            requests.get(base_url + '/', timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Le serveur ne répond pas, voir {log_path}")
+
+
+def rss_kib(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], cwd=ROOT) != 0
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# ------------------------------------------------------------------ clients
+
+class SimulatedUser:
+
+    def __init__(self, base_url, index, recorder):
+        self.base_url = base_url
+        self.username = f'load{index}'
+        self.number = f'07{index:08d}'
+        self.http = requests.Session()
+        self.sio = socketio.Client(http_session=self.http, reconnection=False)
+        self.sio.on('receive_message', recorder.on_receive)
+
+    def sign_in(self):
+        self.http.post(self.base_url + '/register', data={
+            'username': self.username, 'number': self.number,
+            'password': PASSWORD, 'confirm_password': PASSWORD
+        })
+        response = self.http.post(self.base_url + '/login', allow_redirects=False,
+                                  data={'username': self.username, 'password': PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError(f"Connexion refusée pour {self.username} ({response.status_code})")
+
+    def connect(self):
+        self.sio.connect(self.base_url, transports=['websocket'])
+
+
+class Recorder:
+    """Heure d'envoi de chaque message + latences de livraison."""
+
+    def __init__(self):
+        self.sent = {}
+        self.latencies = []
+        self.deliveries = 0
+        self.measuring = False
+
+    def on_receive(self, data):
+        now = time.perf_counter()
+        parts = (data.get('message') or '').split()
+        if len(parts) == 2 and parts[0] == 'loadgen':
+            sent_at = self.sent.get(parts[1])
+            if sent_at is not None:
+                self.deliveries += 1
+                if self.measuring:
+                    self.latencies.append((now - sent_at) * 1000)
+
+
+def scrape(session, base_url):
+    """/metrics → {(nom, labels): valeur}."""
+    samples = {}
+    for line in session.get(base_url + '/metrics').text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        name_labels, value = line.rsplit(' ', 1)
+        name, _, labels = name_labels.partition('{')
+        samples[(name, labels.rstrip('}'))] = float(value)
+    return samples
+
+
+def histogram_delta(before, after, name, labels=''):
+    """Seaux cumulés (borne, compte), somme et nombre observés entre deux collectes."""
+    prefix = labels + ',' if labels else ''
+    buckets = []
+    for (sample, sample_labels), value in after.items():
+        if sample == name + '_bucket' and sample_labels.startswith(prefix + 'le='):
+            bound = sample_labels[len(prefix) + 4:-1]
+            previous = before.get((sample, sample_labels), 0)
+            buckets.append((float('inf') if bound == '+Inf' else float(bound), value - previous))
+    total = after.get((name + '_sum', labels), 0) - before.get((name + '_sum', labels), 0)
+    count = after.get((name + '_count', labels), 0) - before.get((name + '_count', labels), 0)
+    return sorted(buckets), total, count
+
+
+def histogram_quantile(buckets, q):
+    # Borne supérieure du seau qui contient le quantile (comme Prometheus, sans interpolation)
+    if not buckets or not buckets[-1][1]:
+        return None
+    rank = q * buckets[-1][1]
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            return bound
+    return None
+
+
+def server_metrics(before, after):
+    handler, _, _ = histogram_delta(before, after, 'chat_socketio_event_seconds', 'event="send_message"')
+    _, queries, units = histogram_delta(before, after, 'chat_db_queries_per_request',
+                                        'context="socket:send_message"')
+    _, query_seconds, query_count = histogram_delta(before, after, 'chat_db_query_seconds',
+                                                    'context="socket:send_message"')
+    _, wait_seconds, checkouts = histogram_delta(before, after, 'chat_db_pool_checkout_wait_seconds',
+                                                 'engine="primary"')
+    _, recipients, broadcasts = histogram_delta(before, after, 'chat_broadcast_recipients',
+                                                'event="receive_message"')
+    as_ms = lambda seconds: None if seconds in (None, float('inf')) else round(seconds * 1000, 2)  # noqa: E731
+    return {
+        'send_message_handler_p50_ms': as_ms(histogram_quantile(handler, 0.5)),
+        'send_message_handler_p99_ms': as_ms(histogram_quantile(handler, 0.99)),
+        'queries_per_send_message': round(queries / units, 2) if units else None,
+        'query_ms_per_send_message': round(query_seconds / units * 1000, 3) if units else None,
+        'sql_queries_in_handlers': int(query_count),
+        'pool_wait_ms_avg': round(wait_seconds / checkouts * 1000, 3) if checkouts else None,
+        'fanout_avg': round(recipients / broadcasts, 1) if broadcasts else None,
+    }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))], 2)
+
+
+def in_parallel(fn, items, concurrency):
+    pool = eventlet.GreenPool(concurrency)
+    return list(pool.imap(fn, items))
+
+
+# ------------------------------------------------------------------ mesure
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='loadgen-')
+    db_path = os.path.join(workdir, 'chat.db')
+    log_path = os.path.join(workdir, 'server.log')
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    process, base_url = start_server(args.port or free_port(), db_path, log_path, extra_env)
+    print(f"Serveur {base_url} (pid {process.pid}), journal : {log_path}")
+
+    recorder = Recorder()
+    users = [SimulatedUser(base_url, i, recorder) for i in range(args.clients)]
+    try:
+        started = time.perf_counter()
+        users[0].sign_in()  # Seul, pour obtenir l'id 1
+        in_parallel(lambda user: user.sign_in(), users[1:], args.concurrency)
+        print(f"{args.clients} comptes inscrits et connectés en {time.perf_counter() - started:.1f} s")
+        admin = users[0].http
+
+        rss_before = rss_kib(process.pid)
+        started = time.perf_counter()
+        in_parallel(lambda user: user.connect(), users, args.concurrency)
+        connect_seconds = time.perf_counter() - started
+        eventlet.sleep(1)
+        rss_after = rss_kib(process.pid)
+        print(f"{args.clients} sockets ouvertes en {connect_seconds:.1f} s")
+
+        stats_before = admin.get(base_url + '/admin/cache_stats').json()['message_writer']
+        metrics_before = scrape(admin, base_url)
+
+        senders = users[:max(1, min(args.senders, len(users)))]
+        interval = 1.0 / args.rate
+        total = int(args.rate * (args.warmup + args.duration))
+        warmup = int(args.rate * args.warmup)
+        next_send = time.perf_counter()
+        measure_started = None
+        for seq in range(total):
+            eventlet.sleep(max(0, next_send - time.perf_counter()))
+            if seq == warmup:
+                recorder.measuring = True
+                recorder.deliveries = 0
+                measure_started = time.perf_counter()
+                measured_from = seq
+            token = str(seq)
+            recorder.sent[token] = time.perf_counter()
+            senders[seq % len(senders)].sio.emit('send_message', {'message': f'loadgen {token}'})
+            next_send += interval
+        send_seconds = time.perf_counter() - measure_started
+
+        last_send = time.perf_counter()
+
+        # Délai jusqu'à ce que tout soit en base, puis dernières livraisons
+        while True:
+            stats_after = admin.get(base_url + '/admin/cache_stats').json()['message_writer']
+            written = stats_after['flushed'] + stats_after['spilled']
+            if written >= stats_after['queued'] or time.perf_counter() - last_send > 30:
+                break
+            eventlet.sleep(0.01)
+        persist_lag = time.perf_counter() - last_send
+        eventlet.sleep(max(0, args.drain - persist_lag))
+        metrics_after = scrape(admin, base_url)
+        recorder.measuring = False
+        measured = total - measured_from
+
+        flushed = stats_after['flushed'] - stats_before['flushed']
+        batches = stats_after['batches'] - stats_before['batches']
+        flush_seconds = stats_after['flush_seconds'] - stats_before['flush_seconds']
+        expected = measured * args.clients
+
+        return {
+            'commit': git_commit(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'params': {k: v for k, v in vars(args).items() if k not in ('compare', 'output')},
+            'latency_ms': {
+                'p50': percentile(recorder.latencies, 50),
+                'p90': percentile(recorder.latencies, 90),
+                'p99': percentile(recorder.latencies, 99),
+                'max': round(max(recorder.latencies), 2) if recorder.latencies else None,
+            },
+            'throughput': {
+                'sent_per_s': round(measured / send_seconds, 1),
+                'deliveries_per_s': round(recorder.deliveries / send_seconds, 1),
+                'delivery_ratio': round(recorder.deliveries / expected, 4) if expected else None,
+            },
+            'memory': {
+                'rss_kib_before_connect': rss_before,
+                'rss_kib_after_connect': rss_after,
+                'kib_per_connection': round((rss_after - rss_before) / args.clients, 1)
+                if rss_before and rss_after else None,
+                'connect_seconds': round(connect_seconds, 2),
+            },
+            'db': {
+                'batches': batches,
+                'rows_per_batch': round(flushed / batches, 1) if batches else None,
+                'flush_ms_per_batch': round(flush_seconds / batches * 1000, 2) if batches else None,
+                'flush_ms_per_message': round(flush_seconds / flushed * 1000, 3) if flushed else None,
+                'persist_lag_s': round(persist_lag, 2),
+                'sync_fallbacks': stats_after['sync_fallbacks'] - stats_before['sync_fallbacks'],
+            },
+            'server': server_metrics(metrics_before, metrics_after),
+        }
+    finally:
+        for user in users:
+            if user.sio.connected:
+                user.sio.disconnect()
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# ------------------------------------------------------------------ rapport
+
+def flatten(result):
+    rows = []
+    for section in ('latency_ms', 'throughput', 'memory', 'db', 'server'):
+        for key, value in result.get(section, {}).items():
+            rows.append((f'{section}.{key}', value))
+    return rows
+
+
+def print_result(result):
+    print(f"\ncommit {result['commit']} — {result['date']}")
+    for name, value in flatten(result):
+        print(f"  {name:<36}{value}")
+
+
+def compare(paths):
+    results = []
+    for path in paths:
+        with open(path) as f:
+            results.append(json.load(f))
+    print(f"{'':<36}" + ''.join(f"{r['commit']:>16}" for r in results))
+    for name, _ in flatten(results[0]):
+        section, key = name.split('.', 1)
+        print(f"{name:<36}" + ''.join(f"{str(r.get(section, {}).get(key)):>16}" for r in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=50, help='connexions Socket.IO')
+    parser.add_argument('--senders', type=int, default=5, help='clients qui envoient')
+    parser.add_argument('--rate', type=float, default=20, help='messages envoyés par seconde (total)')
+    parser.add_argument('--duration', type=float, default=10, help='secondes mesurées')
+    parser.add_argument('--warmup', type=float, default=2, help='secondes ignorées au début')
+    parser.add_argument('--drain', type=float, default=2, help='attente des dernières livraisons')
+    parser.add_argument('--concurrency', type=int, default=20, help='inscriptions/connexions simultanées')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--env', action='append', default=[], metavar='CLÉ=VALEUR',
+                        help='variable passée au serveur (ex. MESSAGE_WRITE_MODE=sync)')
+    parser.add_argument('--output', help='fichier JSON (défaut : bench/results/<commit>-<date>.json)')
+    parser.add_argument('--compare', nargs='+', metavar='JSON', help='compare des résultats enregistrés')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+
+    result = run(args)
+    print_result(result)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{result['commit']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nRésultats : {output}")
+
+
+if __name__ == '__main__':
+    main()
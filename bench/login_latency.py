@@ -0,0 +1,115 @@
+# bench/login_latency.py — LATENCE DES MESSAGES PENDANT UNE RAFALE DE CONNEXIONS
+#
+# Un émetteur envoie un message toutes les --interval secondes pendant que
+# --logins green threads enchaînent des POST /login. La latence d'un message
+# = réception de `receive_message` − instant prévu de l'envoi : elle inclut
+# le temps pendant lequel le hub eventlet était gelé par un hachage.
+# Mesuré avec le hachage dans le hub (PASSWORD_WORKERS=0) puis dans le pool.
+#
+#   python bench/login_latency.py --logins 50 --duration 5
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'login_latency.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as chat  # noqa: E402
+import extensions as ext  # noqa: E402
+import passwords  # noqa: E402
+from commands import init_db  # noqa: E402
+from models import db, User  # noqa: E402
+
+PASSWORD = 'secret123'
+
+
+def create_users(count):
+    with chat.app.app_context():
+        init_db()
+        for i in range(count + 1):
+            user = User(username=f'bench{i}', number=f'06{i:08d}')
+            user.set_password(PASSWORD)
+            db.session.add(user)
+        db.session.commit()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def run(mode, args):
+    passwords.init_pool(args.workers if mode == 'pool' else 0, args.queue_max)
+
+    sender = chat.app.test_client()
+    sender.post('/login', data={'username': 'bench0', 'password': PASSWORD})
+    socket = chat.socketio.test_client(chat.app, flask_test_client=sender)
+    socket.get_received()
+
+    stop = time.perf_counter() + args.duration
+    results = {'ok': 0, 'busy': 0}
+
+    def login_loop(i):
+        client = chat.app.test_client()
+        while time.perf_counter() < stop:
+            response = client.post('/login', data={'username': f'bench{i}', 'password': PASSWORD})
+            if response.status_code == 503:
+                results['busy'] += 1
+                eventlet.sleep(0.1)  # Un vrai client réessaie plus tard
+                continue
+            results['ok'] += 1
+            client.get('/logout')
+
+    logins = [eventlet.spawn(login_loop, i % args.users + 1) for i in range(args.logins)]
+
+    latencies = []
+    next_send = time.perf_counter()
+    while next_send < stop:
+        eventlet.sleep(max(0, next_send - time.perf_counter()))
+        socket.emit('send_message', {'message': 'ping'})
+        received = [p for p in socket.get_received() if p['name'] == 'receive_message']
+        if received:
+            latencies.append((time.perf_counter() - next_send) * 1000)
+        next_send += args.interval
+
+    for greenlet in logins:
+        greenlet.wait()
+    socket.disconnect()
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=50, help='connexions simultanées')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=5.0, help='secondes par mesure')
+    parser.add_argument('--interval', type=float, default=0.01, help='secondes entre deux messages')
+    parser.add_argument('--workers', type=int, default=chat.app.config['PASSWORD_WORKERS'])
+    parser.add_argument('--queue-max', type=int, default=chat.app.config['PASSWORD_QUEUE_MAX'])
+    args = parser.parse_args()
+
+    print(f"Création de {args.users} comptes…")
+    create_users(args.users)
+
+    print(f"\n{args.logins} connexions en parallèle, un message toutes les {args.interval * 1000:.0f} ms\n")
+    print(f"{'hachage':<10}{'msgs':>7}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'logins':>9}{'503':>7}")
+    for mode in ('hub', 'pool'):
+        latencies, results = run(mode, args)
+        print(f"{mode:<10}{len(latencies):>7}{percentile(latencies, 50):>10.1f}"
+              f"{percentile(latencies, 99):>10.1f}{max(latencies or [0]):>10.1f}"
+              f"{results['ok']:>9}{results['busy']:>7}")
+
+    ext.message_writer.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# bench/presence_storm.py — OCTETS ÉMIS PENDANT UNE TEMPÊTE DE RECONNEXIONS
+#
+# Compare l'ancien protocole (compteur + liste complète à chaque connexion)
+# au protocole par deltas de presence.py, sans réseau : chaque émission est
+# encodée en JSON et comptée autant de fois qu'elle a de destinataires.
+#
+# L'ancien protocole n'envoyait la liste qu'au client qui se connecte : les
+# autres n'apprenaient jamais les arrivées suivantes (~N²/2 entrées). Une
+# liste juste pour tous coûte au moins ~N² entrées, d'où l'écart au-delà du
+# délai de grâce, où tout le monde revient comme « nouveau ».
+#
+#   python bench/presence_storm.py --clients 1000
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from presence import STORM_CHANGES, MemoryPresenceStore, PresenceTracker  # noqa: E402
+
+
+class Hub:
+    """Sockets connectées + compteur d'octets envoyés."""
+
+    def __init__(self):
+        self.sids = set()
+        self.bytes = 0
+        self.packets = 0
+        self.timers = []
+        self.now = 0.0  # Horloge simulée, avancée par sleep()
+        self._timer_clock = 0.0
+
+    def emit(self, event, data, to=None, skip_sid=None):
+        if to is not None:
+            recipients = 1 if to in self.sids else 0
+        else:
+            recipients = len(self.sids) - (1 if skip_sid in self.sids else 0)
+        self.bytes += len(json.dumps([event, data])) * recipients
+        self.packets += recipients
+
+    def spawn(self, fn, *args):
+        self.timers.append((fn, args))
+
+    def sleep(self, seconds):
+        # Les green threads dorment en parallèle : chacune a sa propre horloge
+        self._timer_clock += seconds
+        self.now = max(self.now, self._timer_clock)
+
+    def run_timers(self):
+        while self.timers:
+            timers, self.timers = self.timers, []
+            start = self.now
+            for fn, args in timers:
+                self._timer_clock = start
+                fn(*args)
+
+
+def user_info(uid):
+    return {'username': f'etudiant{uid}', 'avatar': f'/static/uploads/avatars/{uid}_a1b2c3d4.png'}
+
+
+def legacy_storm(clients):
+    # Ancien handle_connect : user_count + liste complète au client qui se connecte
+    hub, users = Hub(), {}
+    for uid in range(1, clients + 1):
+        hub.sids.add(f'sid-{uid}')
+        users[uid] = user_info(uid)
+    hub.bytes = hub.packets = 0
+
+    for uid in range(1, clients + 1):
+        hub.sids.discard(f'sid-{uid}')
+        del users[uid]
+        hub.emit('user_count', len(users), to=f'sid-{uid}')  # perdu : socket déjà fermée
+    for uid in range(1, clients + 1):
+        sid = f'sid-{uid}-r'
+        hub.sids.add(sid)
+        users[uid] = user_info(uid)
+        hub.emit('user_count', len(users), to=sid)
+        hub.emit('update_online_users', [dict(info, id=u) for u, info in users.items()], to=sid)
+    return hub
+
+
+def delta_storm(clients, within_grace, storm_changes=STORM_CHANGES):
+    hub = Hub()
+    tracker = PresenceTracker(MemoryPresenceStore(), hub.emit, hub.spawn, hub.sleep,
+                              storm_changes=storm_changes, clock=lambda: hub.now)
+    for uid in range(1, clients + 1):
+        hub.sids.add(f'sid-{uid}')
+        tracker.connect(uid, f'sid-{uid}', user_info(uid))
+    hub.run_timers()  # Fin de la tempête des premières connexions
+    seq = tracker.store.seq()
+    hub.bytes = hub.packets = 0
+
+    for uid in range(1, clients + 1):
+        hub.sids.discard(f'sid-{uid}')
+        tracker.disconnect(uid, f'sid-{uid}')
+    if not within_grace:
+        hub.run_timers()
+    for uid in range(1, clients + 1):
+        sid = f'sid-{uid}-r'
+        hub.sids.add(sid)
+        tracker.connect(uid, sid, user_info(uid), since=seq)
+    hub.run_timers()
+    return hub
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=1000)
+    args = parser.parse_args()
+
+    rows = [
+        ('ancien protocole (liste complète)', legacy_storm(args.clients)),
+        ('deltas, reconnexion < délai de grâce', delta_storm(args.clients, within_grace=True)),
+        ('deltas, > grâce, sans détection de tempête',
+         delta_storm(args.clients, within_grace=False, storm_changes=float('inf'))),
+        ('deltas, > grâce, instantané de tempête', delta_storm(args.clients, within_grace=False)),
+    ]
+    print(f"Tempête de reconnexions : {args.clients} clients\n")
+    print(f"{'scénario':<40}{'paquets':>12}{'octets':>16}{'octets/client':>16}")
+    for label, hub in rows:
+        print(f"{label:<40}{hub.packets:>12}{hub.bytes:>16}{hub.bytes // args.clients:>16}")
+
+
+if __name__ == '__main__':
+    main()
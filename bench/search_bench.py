@@ -0,0 +1,121 @@
+# bench/search_bench.py — LATENCE DE RECHERCHE SUR UN CORPUS SYNTHÉTIQUE
+#
+# Génère N messages dans une base SQLite jetable (schéma de models.py +
+# index FTS5 de search.py), puis compare la recherche indexée au LIKE '%x%'.
+#
+#   python bench/search_bench.py --rows 2000000
+#   python bench/search_bench.py --rows 2000000 --db /tmp/corpus.db   (réutilise la base)
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, text  # noqa: E402
+
+from models import db, Message, User  # noqa: E402
+import search  # noqa: E402
+
+VOCABULARY = (
+    "bonjour salut merci examen cours maths physique chimie devoir projet rendu "
+    "bibliothèque cantine soirée match football réunion groupe professeur amphi "
+    "partiel révisions notes stage alternance inscription campus bus retard demain "
+    "aujourd'hui semaine lundi vendredi weekend café pause exercice correction td tp"
+).split()
+RARE = ['thermodynamique', 'épistémologie', 'quaternion', 'ornithorynque']
+
+
+def build_corpus(engine, rows, batch=20000):
+    db.Model.metadata.create_all(engine, tables=[User.__table__, Message.__table__])
+    with engine.begin() as conn:
+        search.install(conn)
+        conn.execute(insert(User), [
+            {'id': uid, 'username': f'etudiant{uid}', 'number': f'07000{uid:05d}', 'password_hash': 'x'}
+            for uid in range(1, 501)
+        ])
+
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    # Distribution de Zipf approximative : quelques mots très fréquents
+    weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+    inserted = 0
+    t0 = time.perf_counter()
+    while inserted < rows:
+        chunk = []
+        for i in range(inserted, min(rows, inserted + batch)):
+            words = rng.choices(VOCABULARY, weights, k=rng.randint(3, 15))
+            if rng.random() < 0.001:
+                words.append(rng.choice(RARE))
+            uid = rng.randint(1, 500)
+            chunk.append({
+                'id': i + 1,
+                'username': f'etudiant{uid}',
+                'message': ' '.join(words),
+                'timestamp': start + timedelta(seconds=i * 15),
+                'user_id': uid,
+                'is_private': False,
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(Message), chunk)
+        inserted += len(chunk)
+        print(f"\r  {inserted}/{rows} messages ({time.perf_counter() - t0:.0f}s)", end='', flush=True)
+    print()
+
+
+def timed(conn, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn.execute(text(sql), params).fetchall()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--db', help="fichier SQLite (créé s'il n'existe pas)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-like', action='store_true', help="ne pas mesurer LIKE (lent)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'search_bench.db')
+    engine = create_engine(f'sqlite:///{path}')
+    if not os.path.exists(path) or os.path.getsize(path) == 0 or args.db is None:
+        print(f"Génération de {args.rows} messages dans {path}")
+        build_corpus(engine, args.rows)
+
+    # Même requête que search.search_messages (première page)
+    fts = (
+        "SELECT message.id FROM ("
+        "  SELECT rowid, bm25(message_fts) AS rank FROM message_fts"
+        "  WHERE message_fts MATCH :query ORDER BY rowid DESC LIMIT :window"
+        ") AS hits JOIN message ON message.id = hits.rowid "
+        "WHERE (message.is_private = false OR message.user_id = 1) "
+        "ORDER BY hits.rank, message.id DESC LIMIT 21"
+    )
+    like = "SELECT id FROM message WHERE message LIKE :pattern ORDER BY id DESC LIMIT 21"
+
+    with engine.connect() as conn:
+        count = conn.execute(text("SELECT count(*) FROM message")).scalar()
+        print(f"\nCorpus : {count} messages — médiane / max sur {args.repeat} essais (ms)\n")
+        print(f"{'terme':<22}{'FTS5':>18}{'LIKE %x%':>18}")
+        for term in ['thermodynamique', 'quaternion', 'partiel', 'bonjour', 'révisions demain', 'introuvable']:
+            fts_med, fts_max = timed(
+                conn, fts, {'query': search._fts5_query(term), 'window': search.RANK_WINDOW}, args.repeat)
+            if args.skip_like:
+                like_col = '-'
+            else:
+                like_med, like_max = timed(conn, like, {'pattern': f'%{term}%'}, args.repeat)
+                like_col = f'{like_med:.1f} / {like_max:.1f}'
+            print(f"{term:<22}{f'{fts_med:.1f} / {fts_max:.1f}':>18}{like_col:>18}")
+
+
+if __name__ == '__main__':
+    main()
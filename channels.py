@@ -0,0 +1,142 @@
+# channels.py — SALONS NOMMÉS
+#
+# Chaque message public appartient à un salon (Message.channel_id) ; les
+# messages privés n'en ont pas. On rejoint et on quitte un salon
+# (ChannelMember) ; le salon par défaut est ouvert à tous, sans adhésion.
+#
+# Une page de chat affiche un seul salon : sa socket n'entre que dans les
+# salons Socket.IO de celui-ci (un par format de diffusion, voir wire.py).
+# Un message n'est donc encodé et envoyé qu'aux sockets qui l'affichent, et
+# le nombre de personnes en ligne est compté par salon (dans le registre de
+# présence : le même pour tous les workers).
+
+import re
+import threading
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Channel, ChannelMember
+
+DEFAULT_CHANNEL = 'general'
+NAME_PATTERN = re.compile(r'^[\w-]{2,50}$')
+
+_default_id = None
+
+
+def channel_room(channel_id, fmt):
+    return f'channel:{channel_id}:{fmt}'
+
+
+def ensure_default_channel():
+    """Crée le salon par défaut s'il manque (base neuve) ; renvoie son id."""
+    channel = Channel.query.filter_by(name=DEFAULT_CHANNEL).first()
+    if channel is None:
+        channel = Channel(name=DEFAULT_CHANNEL)
+        db.session.add(channel)
+        db.session.commit()
+    return channel.id
+
+
+def default_channel_id():
+    global _default_id
+    if _default_id is None:
+        _default_id = ensure_default_channel()
+    return _default_id
+
+
+def get_channel(channel_id):
+    return db.session.get(Channel, channel_id) if channel_id else None
+
+
+def is_member(channel_id, user_id):
+    if channel_id == default_channel_id():
+        return True
+    return db.session.get(ChannelMember, (channel_id, user_id)) is not None
+
+
+def channels_for(user_id):
+    """Tous les salons, par nom, avec `joined` pour ceux de l'utilisateur."""
+    default = default_channel_id()
+    joined = {row.channel_id for row in ChannelMember.query.filter_by(user_id=user_id)}
+    joined.add(default)
+    return [dict(channel.to_dict(), joined=channel.id in joined, default=channel.id == default)
+            for channel in Channel.query.order_by(Channel.name)]
+
+
+def create_channel(name, user_id):
+    """Nouveau salon, rejoint par son créateur ; ValueError si le nom est invalide ou pris."""
+    name = (name or '').strip().lower()
+    if not NAME_PATTERN.match(name):
+        raise ValueError('Nom de salon invalide (2 à 50 lettres, chiffres, - ou _)')
+    channel = Channel(name=name, created_by=user_id)
+    db.session.add(channel)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        raise ValueError('Ce salon existe déjà')
+    db.session.add(ChannelMember(channel_id=channel.id, user_id=user_id))
+    db.session.commit()
+    return channel
+
+
+def join(channel_id, user_id):
+    if get_channel(channel_id) is None:
+        raise ValueError('Salon introuvable')
+    if not is_member(channel_id, user_id):
+        db.session.add(ChannelMember(channel_id=channel_id, user_id=user_id))
+        db.session.commit()
+
+
+def leave(channel_id, user_id):
+    if channel_id == default_channel_id():
+        raise ValueError('Le salon par défaut ne se quitte pas')
+    ChannelMember.query.filter_by(channel_id=channel_id, user_id=user_id).delete()
+    db.session.commit()
+
+
+class ChannelOccupancy:
+    """Sockets de ce processus par salon affiché ; les comptes en ligne sont
+    tenus dans le registre de présence, partagé entre workers (presence.py)."""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._channels = {}  # channel_id → {sid: user_id}
+        self._sockets = {}   # sid → (channel_id, format de diffusion)
+
+    def enter(self, sid, channel_id, user_id, fmt):
+        with self._lock:
+            self._channels.setdefault(channel_id, {})[sid] = user_id
+            self._sockets[sid] = (channel_id, fmt)
+        self.store.enter_channel(channel_id, user_id)
+
+    def exit(self, sid):
+        """Retire une socket ; renvoie (channel_id, format) ou None."""
+        with self._lock:
+            where = self._sockets.pop(sid, None)
+            if where is None:
+                return None
+            sockets = self._channels.get(where[0], {})
+            user_id = sockets.pop(sid, None)
+            if not sockets:
+                self._channels.pop(where[0], None)
+        self.store.exit_channel(where[0], user_id)
+        return where
+
+    def channel_of(self, sid):
+        where = self._sockets.get(sid)
+        return where[0] if where else None
+
+    def sockets_of(self, channel_id, user_id):
+        with self._lock:
+            return [(sid, self._sockets[sid][1])
+                    for sid, uid in self._channels.get(channel_id, {}).items() if uid == user_id]
+
+    def count(self, channel_id):
+        """Utilisateurs distincts (pas sockets) qui affichent le salon, tous workers confondus."""
+        return self.store.channel_count(channel_id)
+
+    def stats(self):
+        with self._lock:
+            return {'channels': len(self._channels), 'sockets': len(self._sockets)}
@@ -0,0 +1,120 @@
+# commands.py — COMMANDES `flask …`
+#
+# init-db est faite pour l'étape de déploiement (release) : les workers
+# démarrent ensuite sans toucher au schéma. build-assets et warm-templates
+# écrivent sur le disque : elles tournent au démarrage du dyno web (voir
+# Procfile), le disque de l'étape release n'étant pas celui des dynos web.
+# Les workers gunicorn démarrent ensuite sans compresser de fichier ni
+# compiler de gabarit.
+
+import click
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import with_appcontext
+
+import assets
+import channels
+import extensions as ext
+import rollups
+import search
+from models import db
+
+
+INITIAL_REVISION = '1e32f8d2ec3e'  # Schéma de l'ancien db.create_all() du démarrage
+
+
+def init_db():
+    """Base neuve : schéma complet marqué à la dernière migration ; sinon, migrations en attente."""
+    ext.init_migrate(current_app)
+    from alembic.runtime.migration import MigrationContext
+    from flask_migrate import stamp, upgrade
+    with db.engine.connect() as conn:
+        revision = MigrationContext.configure(conn).get_current_revision()
+        tables = set(db.inspect(conn).get_table_names()) - {'alembic_version'}
+    if revision is not None:
+        upgrade()
+        return False
+    if tables:
+        # Créée par l'ancien db.create_all() (sans marque Alembic, ou avec une table
+        # alembic_version vide) : create_all() n'ajouterait pas les nouvelles colonnes
+        stamp(revision=INITIAL_REVISION)
+        upgrade()
+        return False
+    # Base vide
+    db.create_all()
+    channels.ensure_default_channel()
+    search.ensure_search_index()
+    rollups.ensure_backfilled()
+    stamp()
+    return True
+
+
+def warm_templates(app):
+    """Compile tous les gabarits (et remplit le cache de bytecode) ; renvoie leur nombre."""
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Crée le schéma d'une base neuve, ou applique les migrations en attente."""
+    if init_db():
+        print("✅ Schéma créé et marqué à la dernière migration.")
+    else:
+        print("✅ Migrations appliquées.")
+
+
+@click.command('warm-templates')
+@with_appcontext
+def warm_templates_command():
+    """Précompile les gabarits dans TEMPLATE_CACHE_DIR."""
+    count = warm_templates(current_app)
+    print(f"📄 {count} gabarit(s) compilé(s) dans {current_app.config['TEMPLATE_CACHE_DIR']}.")
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Copie static/ vers static/dist/ sous des noms empreintés, avec versions gzip et brotli."""
+    manifest = assets.build(current_app.static_folder)
+    compressed = sum(1 for entry in manifest['files'].values() if entry['encodings'])
+    print(f"📦 {len(manifest['files'])} fichier(s) empreinté(s), {compressed} précompressé(s)"
+          + ("" if assets.brotli else " (gzip seulement : module brotli absent)") + ".")
+
+
+@click.command('gc-uploads')
+@with_appcontext
+def gc_uploads_command():
+    """Supprime les fichiers envoyés qui ne sont plus référencés."""
+    removed = ext.file_store.collect_garbage()
+    print(f"🗑️ {removed} fichier(s) orphelin(s) supprimé(s).")
+
+
+@click.command('archive-messages')
+@click.option('--days', type=int, default=None, help='Fenêtre à garder (défaut : MESSAGE_RETENTION_DAYS).')
+@with_appcontext
+def archive_messages_command(days):
+    """Déplace les messages plus anciens que la fenêtre de rétention vers l'archive."""
+    days = current_app.config['MESSAGE_RETENTION_DAYS'] if days is None else days
+    if days <= 0:
+        print("ℹ️ Rétention désactivée (MESSAGE_RETENTION_DAYS=0) : rien à archiver.")
+        return
+    archived = ext.retention_job.run(before=datetime.utcnow() - timedelta(days=days))
+    print(f"🗄️ {archived} message(s) archivé(s) dans {current_app.config['MESSAGE_ARCHIVE_DIR']}.")
+
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Recalcule les agrégats de /chatting/stats depuis la table message."""
+    rollups.rebuild()
+    print("✅ Agrégats des statistiques reconstruits.")
+
+
+def init_app(app):
+    for command in (init_db_command, warm_templates_command, build_assets_command, gc_uploads_command,
+                    archive_messages_command, rebuild_stats_command):
+        app.cli.add_command(command)
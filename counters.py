@@ -0,0 +1,54 @@
+# counters.py — TOTAUX MIS EN CACHE POUR LE TABLEAU DE BORD
+#
+# Chaque compteur est calculé une fois par une requête COUNT, puis tenu à
+# jour à l'écriture (incr) ; passé le TTL, il est recalculé en base, ce qui
+# rattrape aussi les écritures faites par les autres workers.
+
+import threading
+import time
+
+
+class CachedCounters:
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._loaders = {}
+        self._values = {}  # nom → (valeur, expiration)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+
+    def get(self, name):
+        cached = self._values.get(name)
+        if cached is not None and cached[1] > time.monotonic():
+            self.hits += 1
+            return cached[0]
+        self.misses += 1
+        value = self._loaders[name]()
+        self._values[name] = (value, time.monotonic() + self.ttl)
+        return value
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            cached = self._values.get(name)
+            if cached is not None:
+                self._values[name] = (cached[0] + amount, cached[1])
+
+    def invalidate(self, name=None):
+        if name is None:
+            self._values.clear()
+        else:
+            self._values.pop(name, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'values': {name: value for name, (value, _) in self._values.items()},
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else None,
+        }
@@ -0,0 +1,154 @@
+# database.py — ACCÈS À LA BASE : I/O COOPÉRATIVES ET RÉPLIQUE DE LECTURE
+#
+# psycopg2 est écrit en C : monkey_patch() n'y change rien, et une requête
+# lente bloquait tout le hub eventlet (donc toutes les sockets du worker).
+# Avec un « wait callback » (psycopg2.extensions.set_wait_callback), la libpq
+# travaille en mode asynchrone et chaque attente sur la socket cède la main
+# aux autres green threads (eventlet.hubs.trampoline).
+#
+# REPLICA_DATABASE_URL (facultatif) : les vues marquées @read_replica (chat,
+# historique, stats, admin) lisent sur la réplique ; toute écriture (flush,
+# INSERT/UPDATE/DELETE) et tout le reste vont au primaire. Une réplique peut
+# être en retard de quelques instants : ce qui doit refléter une écriture
+# toute fraîche se lit dans `with primary():`.
+#
+# Pour essayer en local, deux bases suffisent (la « réplique » n'a pas besoin
+# d'être répliquée pour vérifier le routage) :
+#   DATABASE_URL=postgresql://localhost/chat REPLICA_DATABASE_URL=postgresql://localhost/chat_replica \
+#   DATABASE_SSLMODE=disable python bench/db_layer.py
+
+import os
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+
+
+def normalize_url(url):
+    if url and url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def engine_options(database_url, config):
+    # 👇 CONFIGURATION POSTGRESQL POUR EVENTLET
+    if "postgresql" in database_url:
+        return {
+            "pool_pre_ping": True,
+            "pool_size": config['DB_POOL_SIZE'],
+            "max_overflow": config['DB_MAX_OVERFLOW'],
+            "pool_recycle": 300,
+            # Pool épuisé : erreur rapide (et comptée, voir metrics.py) plutôt que 30 s d'attente
+            "pool_timeout": config['DB_POOL_TIMEOUT'],
+            "connect_args": {
+                "sslmode": config['DATABASE_SSLMODE'],  # ← 'require' pour Render
+            }
+        }
+    return {
+        "pool_pre_ping": True,
+        "connect_args": {
+            "check_same_thread": False
+        }
+    }
+
+
+def load_config(app):
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+    app.config['DATABASE_SSLMODE'] = os.environ.get('DATABASE_SSLMODE', 'require')
+    app.config['REPLICA_DATABASE_URL'] = normalize_url(os.environ.get('REPLICA_DATABASE_URL')) or None
+
+
+def init_app(app):
+    """Options des moteurs, réplique éventuelle et pilote PostgreSQL coopératif (avant db.init_app)."""
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS',
+                          engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config))
+    replica_url = app.config['REPLICA_DATABASE_URL']
+    if replica_url:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault(REPLICA_BIND, dict(engine_options(replica_url, app.config), url=replica_url))
+        app.config['SQLALCHEMY_BINDS'] = binds
+    if any('postgresql' in (url or '') for url in (app.config['SQLALCHEMY_DATABASE_URI'], replica_url)):
+        install_green_driver()
+
+
+# ------------------------------------------------------------ psycopg2 coopératif
+
+def eventlet_wait_callback(conn, timeout=-1):
+    """Attend la libpq sans bloquer le hub (même rôle que psycogreen.eventlet)."""
+    from eventlet.hubs import trampoline
+    from psycopg2 import OperationalError, extensions
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        if state == extensions.POLL_READ:
+            trampoline(conn.fileno(), read=True)
+        elif state == extensions.POLL_WRITE:
+            trampoline(conn.fileno(), write=True)
+        else:
+            raise OperationalError(f"État inattendu de la connexion : {state!r}")
+
+
+def install_green_driver():
+    """Installe le wait callback si eventlet a patché le processus ; renvoie True s'il l'est."""
+    try:
+        import eventlet.patcher
+        from psycopg2 import extensions
+    except ImportError:  # Pas d'eventlet ou pas de psycopg2 : rien à rendre coopératif
+        return False
+    if not eventlet.patcher.is_monkey_patched('socket'):
+        # Scripts qui n'importent pas app.py : le pilote bloquant convient. Les commandes
+        # `flask …` importent app.py (monkey_patch) et passent donc aussi par le callback
+        return False
+    extensions.set_wait_callback(eventlet_wait_callback)
+    return True
+
+
+# ------------------------------------------------------------ routage des lectures
+
+def _reading_replica():
+    return has_app_context() and g.get('_db_read_replica', False)
+
+
+class RoutingSession(Session):
+    """Session de Flask-SQLAlchemy qui envoie les lectures des vues @read_replica à la réplique."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) and _reading_replica():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(view):
+    """Vue en lecture seule : ses requêtes vont à la réplique quand elle est configurée."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._db_read_replica = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g._db_read_replica = False
+    return wrapper
+
+
+@contextmanager
+def primary():
+    """Dans une vue @read_replica : lectures qui doivent voir les dernières écritures."""
+    previous = g.get('_db_read_replica', False)
+    g._db_read_replica = False
+    try:
+        yield
+    finally:
+        g._db_read_replica = previous
+
+
+def engine_name(bind_key):
+    return 'primary' if bind_key is None else bind_key
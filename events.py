@@ -0,0 +1,247 @@
+# events.py — GESTIONNAIRES SOCKET.IO
+#
+# Enregistrés sur extensions.socketio dès l'import ; Flask-SocketIO les
+# attache au serveur lors de socketio.init_app().
+
+from flask import current_app, request
+from flask_login import current_user
+from flask_socketio import emit, join_room, leave_room
+
+import channels
+import extensions as ext
+import images
+import metrics
+from extensions import socketio
+from history import MAX_PAGE_SIZE
+from models import Message, serialize_messages
+from views import public_messages
+from wire import COMPACT_EVENT, WIRE_FORMATS, compact_message, wire_format
+
+# Colonnes bornées : une ligne trop longue ferait échouer tout le lot d'insertion (persistence.py)
+MESSAGE_MAX_LENGTH = Message.__table__.c.message.type.length
+FILE_URL_MAX_LENGTH = Message.__table__.c.file_url.type.length
+
+
+def room_size(room=None):
+    # Sockets de ce processus dans `room` (None = toutes les sockets connectées)
+    return len(socketio.server.manager.rooms.get('/', {}).get(room) or ())
+
+def emit_observed(event, data, to=None, skip_sid=None):
+    rooms = to if isinstance(to, list) else [to]
+    metrics.observe_broadcast(event, sum(room_size(room) for room in rooms) - (1 if skip_sid else 0))
+    socketio.emit(event, data, to=to, skip_sid=skip_sid)
+
+
+@socketio.on('connect')
+@metrics.timed_event('connect')
+def handle_connect(auth=None):
+    ext.start_background_tasks(current_app._get_current_object())
+
+    if current_user.is_authenticated:
+        # Salon personnel : les messages privés ne visent que les sessions de l'utilisateur
+        join_room(user_room(current_user.id))
+
+        # Salon affiché par la page (auth.channel), au format choisi par le client (voir wire.py)
+        channel_id = (auth or {}).get('channel') if isinstance(auth, dict) else None
+        if not isinstance(channel_id, int):
+            channel_id = channels.default_channel_id()
+        if channels.is_member(channel_id, current_user.id):
+            enter_channel(channel_id, wire_format(auth))
+
+        # Plusieurs onglets = plusieurs sessions ; `presence_seq` = dernier delta vu par le client
+        since = (auth or {}).get('presence_seq')
+        ext.presence.connect(current_user.id, request.sid, {
+            'username': current_user.username,
+            'avatar': images.variant_url(current_user.avatar, 'thumb')
+        }, since=since if isinstance(since, int) else None)
+
+def user_room(user_id):
+    return f'user_{user_id}'
+
+def enter_channel(channel_id, fmt):
+    join_room(channels.channel_room(channel_id, fmt))
+    ext.channel_sockets.enter(request.sid, channel_id, current_user.id, fmt)
+    emit_channel_count(channel_id)
+
+def emit_channel_count(channel_id):
+    # Remplace l'ancien compte global : seules les sockets du salon le reçoivent
+    emit_observed('channel_count', {'channel_id': channel_id, 'count': ext.channel_sockets.count(channel_id)},
+                  to=[channels.channel_room(channel_id, fmt) for fmt in WIRE_FORMATS])
+
+def broadcast_deleted(rows):
+    # Messages supprimés par l'administrateur : retirés des seuls écrans qui peuvent les afficher
+    by_room = {}
+    for row in rows:
+        if row['channel_id'] is not None:
+            rooms = [channels.channel_room(row['channel_id'], fmt) for fmt in WIRE_FORMATS]
+        else:
+            rooms = [user_room(row['user_id']), user_room(row['recipient_id'])]
+        for room in rooms:
+            by_room.setdefault(room, []).append(row['id'])
+    for room, ids in by_room.items():
+        emit_observed('messages_deleted', {'ids': ids}, to=room)
+
+def disconnect_user(user_id):
+    # Compte supprimé : plus en ligne, onglets prévenus puis déconnectés (ceux de ce processus)
+    ext.presence.logout(user_id)
+    socketio.emit('account_deleted', {}, to=user_room(user_id))
+    for sid, _ in list(socketio.server.manager.get_participants('/', user_room(user_id))):
+        socketio.server.disconnect(sid)
+
+@socketio.on('send_message')
+@metrics.timed_event('send_message')
+def handle_message(data):
+    if not current_user.is_authenticated:
+        return
+    
+    message_text = data.get('message', '').strip()
+    file_url = data.get('file_url') or None
+
+    if not message_text:
+        return
+
+    # 📏 Refusé avant d'être diffusé : la base ne l'accepterait pas
+    if len(message_text) > MESSAGE_MAX_LENGTH or \
+            (file_url is not None and (not isinstance(file_url, str) or len(file_url) > FILE_URL_MAX_LENGTH)):
+        emit('message_rejected', {'error': f'Message trop long ({MESSAGE_MAX_LENGTH} caractères max)'})
+        return
+
+    # 📎 Seulement un fichier du magasin envoyé par l'auteur : une URL inventée
+    # compterait une référence et protégerait ce fichier du ramasse-miettes
+    if file_url is not None and not ext.file_store.uploaded_by(file_url, current_user.id):
+        file_url = None
+
+    # 🚦 Par connexion, puis par utilisateur (plusieurs onglets)
+    wait = ext.rate_limiter.check(ext.limits['messages_sid'], sid=request.sid) or \
+        ext.rate_limiter.check(ext.limits['messages_user'], user=current_user.id)
+    if wait:
+        emit('rate_limited', {'event': 'send_message', 'retry_after': round(wait, 1)})
+        return
+
+    # ✉️ Message privé : destinataire existant, autre que soi-même
+    recipient = None
+    recipient_id = data.get('recipient_id')
+    if recipient_id:
+        try:
+            recipient = ext.user_cache.get(int(recipient_id))
+        except (TypeError, ValueError):
+            recipient = None
+        if recipient is None or recipient.id == current_user.id:
+            return
+
+    # 💬 Message public : dans le salon qu'affiche cette socket (adhésion vérifiée à la connexion)
+    channel_id = None if recipient else ext.channel_sockets.channel_of(request.sid)
+    if not recipient and channel_id is None:
+        return
+
+    # ⚡ Id attribué tout de suite, insertion en base par lots en arrière-plan
+    new_message = ext.message_writer.submit(
+        username=current_user.username,
+        message=message_text,
+        file_url=file_url,
+        user_id=current_user.id,
+        is_private=recipient is not None,
+        recipient_id=recipient.id if recipient else None,
+        channel_id=channel_id
+    )
+
+    # ✅ Même format que l'historique (avatar de l'auteur inclus), sans requête
+    ext.counters.incr('messages')
+    users = {current_user.id: current_user}
+    if recipient:
+        users[recipient.id] = recipient
+    message_data = Message(**new_message).to_dict(users=users)
+
+    if recipient:
+        # Deux salons seulement, quel que soit le nombre de clients connectés
+        ext.counters.incr('private_messages')
+        metrics.messages_sent.inc('private')
+        rooms = [user_room(current_user.id), user_room(recipient.id)]
+        metrics.observe_broadcast('receive_message', sum(room_size(room) for room in rooms))
+        emit('receive_message', message_data, to=rooms)
+        return
+
+    ext.recent_messages.append(channel_id, new_message['timestamp'], message_data)
+    metrics.messages_sent.inc('public')
+    # Un emit par format, vers les seules sockets du salon : chacun est encodé une fois
+    json_room, compact_room = (channels.channel_room(channel_id, fmt) for fmt in ('json', 'compact'))
+    metrics.observe_broadcast('receive_message', room_size(json_room))
+    emit('receive_message', message_data, to=json_room)
+    metrics.observe_broadcast(COMPACT_EVENT, room_size(compact_room))
+    emit(COMPACT_EVENT, compact_message(message_data), to=compact_room)
+
+
+@socketio.on('sync_messages')
+@metrics.timed_event('sync_messages')
+def handle_sync_messages(data):
+    # 🔄 Après une reconnexion : renvoie ce qui a été manqué depuis `after_id`
+    if not current_user.is_authenticated:
+        return []
+    if ext.rate_limiter.check(ext.limits['sync'], sid=request.sid):
+        return []
+    channel_id = ext.channel_sockets.channel_of(request.sid)
+    if channel_id is None:
+        return []
+    after_id = int((data or {}).get('after_id') or 0)
+    messages = ext.recent_messages.channel(channel_id).since(after_id) if ext.recent_messages.enabled else None
+    if messages is None:
+        rows = public_messages(channel_id).filter(Message.id > after_id).order_by(Message.id).limit(MAX_PAGE_SIZE).all()
+        messages = serialize_messages(rows)
+    return messages
+
+
+@socketio.on('disconnect')
+@metrics.timed_event('disconnect')
+def handle_disconnect():
+    where = ext.channel_sockets.exit(request.sid)
+    if where is not None:
+        emit_channel_count(where[0])
+    if current_user.is_authenticated:
+        ext.presence.disconnect(current_user.id, request.sid)
+
+
+# 🏷️ Salons : la page recharge ensuite /students/chat?channel=<id> (voir channels.py)
+
+@socketio.on('create_channel')
+@metrics.timed_event('create_channel')
+def handle_create_channel(data):
+    if not current_user.is_authenticated:
+        return {'success': False, 'error': 'Non connecté'}
+    try:
+        channel = channels.create_channel((data or {}).get('name'), current_user.id)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}
+    return {'success': True, 'channel': channel.to_dict()}
+
+
+@socketio.on('join_channel')
+@metrics.timed_event('join_channel')
+def handle_join_channel(data):
+    if not current_user.is_authenticated:
+        return {'success': False, 'error': 'Non connecté'}
+    try:
+        channels.join(int((data or {}).get('channel_id') or 0), current_user.id)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}
+    return {'success': True}
+
+
+@socketio.on('leave_channel')
+@metrics.timed_event('leave_channel')
+def handle_leave_channel(data):
+    if not current_user.is_authenticated:
+        return {'success': False, 'error': 'Non connecté'}
+    try:
+        channel_id = int((data or {}).get('channel_id') or 0)
+        channels.leave(channel_id, current_user.id)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}
+
+    # Les onglets de ce processus qui affichent le salon n'en reçoivent plus rien ;
+    # tous (autres workers compris) sont prévenus et repartent vers le salon par défaut
+    for sid, fmt in ext.channel_sockets.sockets_of(channel_id, current_user.id):
+        leave_room(channels.channel_room(channel_id, fmt), sid=sid)
+        ext.channel_sockets.exit(sid)
+    emit_channel_count(channel_id)
+    emit('channel_left', {'channel_id': channel_id}, to=user_room(current_user.id))
+    return {'success': True}
@@ -0,0 +1,61 @@
+# extensions.py — EXTENSIONS ET SERVICES PARTAGÉS
+#
+# Créés ici sans application : factory.create_app() les initialise
+# (init_app) ou y range les services configurés. Les vues et les
+# gestionnaires Socket.IO les lisent au moment de l'appel (`ext.file_store`),
+# jamais à l'import.
+
+import os
+
+from flask_login import LoginManager
+from flask_socketio import SocketIO
+
+from models import db  # noqa: F401 (ré-exportée avec les autres extensions)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+socketio = SocketIO()
+login_manager = LoginManager()
+
+# Services configurés par create_app()
+assets = None
+message_writer = None
+file_store = None
+image_pool = None
+image_pipeline = None
+password_pool = None
+user_cache = None
+connected_users = None
+presence = None
+recent_messages = None
+channel_sockets = None
+fragments = None
+counters = None
+rate_limiter = None
+limits = {}  # nom → ratelimit.Limit
+slow_consumers = None
+message_archive = None
+retention_job = None
+moderator = None
+
+
+def init_migrate(app):
+    """Flask-Migrate pour les commandes `flask db …` et init_db().
+
+    Pas à chaque démarrage de worker : l'import d'Alembic coûte ~120 ms.
+    """
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        Migrate(app, db, directory=MIGRATIONS_DIR)
+
+
+def start_background_tasks(app):
+    """Tâches de fond, lancées à la première requête ou connexion (pas à l'import)."""
+    if app.extensions.get('background_tasks_started'):
+        return
+    app.extensions['background_tasks_started'] = True
+    slow_consumers.start()
+    presence.start(app.config['PRESENCE_WORKER_TTL'] / 3)
+    socketio.start_background_task(moderator.watch, app, app.config['MODERATION_LEASE'])
+    if app.config['MESSAGE_RETENTION_DAYS'] > 0:
+        socketio.start_background_task(retention_job.run_forever, app, app.config['RETENTION_INTERVAL'])
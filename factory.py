@@ -0,0 +1,254 @@
+# factory.py — CRÉATION DE L'APPLICATION
+#
+# create_app() ne touche ni la base ni le réseau : connexions SQL et Redis,
+# threads des pools et tâches de fond sont créés à leur premier usage (les
+# tâches de fond à la première requête). Le schéma n'est plus créé au
+# démarrage de chaque worker : `flask init-db` (une fois par déploiement)
+# crée une base neuve ou applique les migrations Alembic en attente.
+
+import os
+
+import click
+from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+
+import commands
+import database
+import events  # enregistre aussi les gestionnaires Socket.IO
+import extensions as ext
+import images
+import metrics
+import passwords
+import rollups
+import views
+from assets import AssetManifest
+from channels import ChannelOccupancy
+from counters import CachedCounters
+from fragments import FragmentCache
+from models import db, User, Message, DailyMessageCount
+from moderation import Moderator
+from persistence import MessageWriter
+from presence import PresenceTracker, create_presence_store
+from ratelimit import Limit, RateLimiter, create_rate_limiter
+from recent import ChannelBuffers
+from backpressure import SlowConsumerMonitor
+from retention import MessageArchive, RetentionJob
+from storage import FileStore
+from usercache import UserCache
+from workers import WorkerPool
+
+
+def load_config(app):
+    app.config['SECRET_KEY'] = 'super-secret-chat-key-2025!'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = 'static/uploads/avatars'
+    # Fichiers envoyés et avatars, rangés par hash de contenu
+    app.config['FILE_STORE_ROOT'] = 'static/uploads/files'
+    # Versions réduites des images (miniature, aperçu), générées en arrière-plan
+    app.config['IMAGE_DERIVED_ROOT'] = 'static/uploads/derived'
+    app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
+    # Limite la taille des requêtes (10 Mo max)
+    app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
+
+    # Récupérer DATABASE_URL ; pool, SSL et réplique de lecture : voir database.py
+    app.config['SQLALCHEMY_DATABASE_URI'] = database.normalize_url(os.environ.get('DATABASE_URL')) or 'sqlite:///chat.db'
+    database.load_config(app)
+
+    # 👇 MULTI-WORKERS : file de messages partagée pour la diffusion Socket.IO
+    # (ex. SOCKETIO_MESSAGE_QUEUE=redis://...) ; sans elle, diffusion locale au processus.
+    # Avec WEB_CONCURRENCY > 1, utiliser PostgreSQL (sur SQLite, l'écriture des messages repasse en sync).
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+    app.config['PRESENCE_STORE_URL'] = os.environ.get('PRESENCE_STORE_URL') or app.config['SOCKETIO_MESSAGE_QUEUE'] or 'memory://'
+    app.config['PRESENCE_LEAVE_GRACE'] = float(os.environ.get('PRESENCE_LEAVE_GRACE', 3))
+    # Redis : sessions d'un worker qui ne s'est pas signalé depuis ce délai purgées par les autres
+    app.config['PRESENCE_WORKER_TTL'] = int(os.environ.get('PRESENCE_WORKER_TTL', 30))
+    # Tampon des derniers messages (inutile en multi-workers : chaque processus ne voit que ses envois)
+    app.config['RECENT_MESSAGES_SIZE'] = 0 if app.config['SOCKETIO_MESSAGE_QUEUE'] else int(os.environ.get('RECENT_MESSAGES_SIZE', 100))
+
+    # 🔐 Hachage des mots de passe dans des threads système (PASSWORD_WORKERS=0 : dans le hub).
+    # Un cœur reste au hub : plus de threads que de cœurs libres ralentit aussi la diffusion
+    app.config['PASSWORD_WORKERS'] = int(os.environ.get('PASSWORD_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+    app.config['PASSWORD_QUEUE_MAX'] = int(os.environ.get('PASSWORD_QUEUE_MAX', 32))
+
+    # 📈 /metrics : admin connecté, ou en-tête « Authorization: Bearer $METRICS_TOKEN » pour Prometheus
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+    # Identités en mémoire : pas de SELECT user à chaque requête / événement Socket.IO
+    app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 1000))
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 60))
+    # HTML rendu des messages du chat, gardé par id (0 : rendu à chaque affichage)
+    app.config['FRAGMENT_CACHE_SIZE'] = int(os.environ.get('FRAGMENT_CACHE_SIZE', 2000))
+    # Totaux du tableau de bord : tenus à jour à l'écriture, recalculés après COUNTERS_TTL secondes
+    app.config['COUNTERS_TTL'] = int(os.environ.get('COUNTERS_TTL', 60))
+
+    # 🚦 Limites de débit (« jetons par seconde/taille du seau »), partagées entre
+    # workers quand RATE_LIMIT_STORE_URL pointe sur Redis
+    app.config['RATE_LIMIT_STORE_URL'] = os.environ.get('RATE_LIMIT_STORE_URL') or app.config['PRESENCE_STORE_URL']
+    app.config['RATE_LIMIT_MESSAGES_SID'] = os.environ.get('RATE_LIMIT_MESSAGES_SID', '1/5')
+    app.config['RATE_LIMIT_MESSAGES_USER'] = os.environ.get('RATE_LIMIT_MESSAGES_USER', '2/10')
+    app.config['RATE_LIMIT_SYNC'] = os.environ.get('RATE_LIMIT_SYNC', '0.5/5')
+    app.config['RATE_LIMIT_UPLOADS'] = os.environ.get('RATE_LIMIT_UPLOADS', '0.1/5')
+
+    # 🐢 Clients lents : au-delà de SLOW_CONSUMER_MAX_QUEUE paquets en attente,
+    # 'drop' (abandon + resync) ou 'disconnect'. 0 désactive la surveillance
+    app.config['SLOW_CONSUMER_MAX_QUEUE'] = int(os.environ.get('SLOW_CONSUMER_MAX_QUEUE', 500))
+    app.config['SLOW_CONSUMER_POLICY'] = os.environ.get('SLOW_CONSUMER_POLICY', 'drop')
+
+    # 🗄️ Rétention : au-delà de MESSAGE_RETENTION_DAYS jours (0 = tout garder), les messages
+    # partent par lots dans des fichiers gzip quotidiens ; l'historique continue d'y lire
+    app.config['MESSAGE_RETENTION_DAYS'] = int(os.environ.get('MESSAGE_RETENTION_DAYS', 0))
+    app.config['MESSAGE_ARCHIVE_DIR'] = os.environ.get('MESSAGE_ARCHIVE_DIR') or os.path.join(app.instance_path, 'archive')
+    app.config['RETENTION_INTERVAL'] = int(os.environ.get('RETENTION_INTERVAL', 3600))
+    app.config['RETENTION_BATCH_SIZE'] = int(os.environ.get('RETENTION_BATCH_SIZE', 1000))
+
+    # 🧹 Suppressions de l'administrateur : en arrière-plan, par lots de MODERATION_BATCH_SIZE messages
+    app.config['MODERATION_BATCH_SIZE'] = int(os.environ.get('MODERATION_BATCH_SIZE', 500))
+    app.config['MODERATION_MAX_TARGETS'] = int(os.environ.get('MODERATION_MAX_TARGETS', 500))
+    # Tâche sans lot terminé depuis ce délai (worker arrêté) : reprise par un autre worker
+    app.config['MODERATION_LEASE'] = int(os.environ.get('MODERATION_LEASE', 60))
+
+    # 📄 Gabarits compilés gardés sur disque : un worker qui redémarre ne recompile rien
+    app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+
+
+def create_app(config=None):
+    """`config` : valeurs qui remplacent celles de l'environnement (tests, bancs d'essai)."""
+    app = Flask(__name__, static_folder="static", template_folder="templates")
+    load_config(app)
+    app.config.update(config or {})
+    database.init_app(app)
+
+    os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+    app.jinja_options = dict(app.jinja_options,
+                             bytecode_cache=FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR']))
+
+    # Initialiser les extensions
+    db.init_app(app)
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            metrics.name_engine(engine, database.engine_name(bind_key))
+    ext.socketio.init_app(app, async_mode="eventlet", cors_allowed_origins="*",
+                          message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
+    ext.login_manager.login_view = 'login'
+    ext.login_manager.init_app(app)
+    if click.get_current_context(silent=True) is not None:
+        ext.init_migrate(app)  # Chargée par `flask …` : commandes `flask db …`
+    metrics.init_app(app)
+
+    init_services(app)
+    register_gauges()
+
+    views.init_app(app)
+    commands.init_app(app)
+    app.add_template_filter(images.variant_url, 'variant')
+
+    # 📦 url_for('static', …) → fichiers empreintés de `flask build-assets`, servis immuables
+    ext.assets = AssetManifest(app.static_folder)
+    ext.assets.init_app(app)
+
+    @app.before_request
+    def _start_background_tasks():
+        ext.start_background_tasks(app)
+
+    @app.teardown_appcontext
+    def shutdown_session(exception=None):
+        if exception:
+            db.session.rollback()
+        db.session.remove()
+
+    return app
+
+
+def init_services(app):
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    # Persistance différée des messages (MESSAGE_WRITE_MODE=sync pour revenir au commit direct)
+    ext.message_writer = MessageWriter(app, ext.socketio)
+    ext.file_store = FileStore(app.config['FILE_STORE_ROOT'], url_prefix='/' + app.config['FILE_STORE_ROOT'])
+
+    # Dans la transaction d'insertion : agrégats des stats et références aux fichiers
+    ext.message_writer.on_persist(rollups.record_messages)
+    ext.message_writer.on_persist(lambda rows: ext.file_store.add_refs(row.get('file_url') for row in rows))
+    ext.message_writer.allocator.floor = lambda: ext.message_archive.max_id()
+
+    # 🖼️ Redimensionnement hors du hub eventlet (Pillow est coûteux en CPU)
+    ext.image_pool = WorkerPool('images', size=app.config['IMAGE_WORKERS'])
+    ext.image_pipeline = images.ImagePipeline(app.static_folder, app.config['IMAGE_DERIVED_ROOT'], ext.image_pool)
+    ext.password_pool = passwords.init_pool(app.config['PASSWORD_WORKERS'], app.config['PASSWORD_QUEUE_MAX'])
+
+    ext.user_cache = UserCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+    @ext.login_manager.user_loader
+    def load_user(user_id):
+        return ext.user_cache.get(int(user_id))
+
+    # Utilisateurs en ligne, partagés entre workers quand PRESENCE_STORE_URL pointe sur Redis
+    ext.connected_users = create_presence_store(app.config['PRESENCE_STORE_URL'],
+                                               worker_ttl=app.config['PRESENCE_WORKER_TTL'])
+    ext.presence = PresenceTracker(
+        ext.connected_users,
+        emit=lambda event, data, to=None, skip_sid=None: events.emit_observed(event, data, to=to, skip_sid=skip_sid),
+        spawn=ext.socketio.start_background_task,
+        sleep=ext.socketio.sleep,
+        grace=app.config['PRESENCE_LEAVE_GRACE']
+    )
+
+    ext.recent_messages = ChannelBuffers(app.config['RECENT_MESSAGES_SIZE'])
+    ext.channel_sockets = ChannelOccupancy(ext.connected_users)
+    ext.fragments = FragmentCache(app.jinja_env, maxsize=app.config['FRAGMENT_CACHE_SIZE'])
+
+    ext.counters = CachedCounters(ttl=app.config['COUNTERS_TTL'])
+    ext.counters.register('users', lambda: User.query.count())
+    ext.counters.register('messages', lambda: db.session.query(
+        db.func.coalesce(db.func.sum(DailyMessageCount.count), 0)).scalar())
+    ext.counters.register('private_messages', lambda: Message.query.filter_by(is_private=True).count())
+
+    ext.limits = {
+        'messages_sid': Limit.parse('msg', app.config['RATE_LIMIT_MESSAGES_SID']),
+        'messages_user': Limit.parse('msg', app.config['RATE_LIMIT_MESSAGES_USER']),
+        'sync': Limit.parse('sync', app.config['RATE_LIMIT_SYNC']),
+        'upload': Limit.parse('upload', app.config['RATE_LIMIT_UPLOADS']),
+    }
+    ext.rate_limiter = RateLimiter(create_rate_limiter(app.config['RATE_LIMIT_STORE_URL']),
+                                   on_reject=lambda limit, scope: metrics.rate_limited.inc(limit.name, scope))
+
+    ext.slow_consumers = SlowConsumerMonitor(
+        ext.socketio,
+        max_queue=app.config['SLOW_CONSUMER_MAX_QUEUE'],
+        policy=app.config['SLOW_CONSUMER_POLICY'],
+        on_action=lambda policy, dropped: metrics.slow_consumer_actions.inc(policy)
+    )
+
+    ext.message_archive = MessageArchive(app.config['MESSAGE_ARCHIVE_DIR'])
+    ext.retention_job = RetentionJob(ext.message_archive, app.config['MESSAGE_RETENTION_DAYS'],
+                                     batch_size=app.config['RETENTION_BATCH_SIZE'],
+                                     sleep=ext.socketio.sleep)
+
+    ext.moderator = Moderator(batch_size=app.config['MODERATION_BATCH_SIZE'],
+                              spawn=ext.socketio.start_background_task, sleep=ext.socketio.sleep,
+                              on_messages_deleted=events.broadcast_deleted,
+                              on_user_deleted=events.disconnect_user,
+                              lease=app.config['MODERATION_LEASE'])
+
+
+def register_gauges():
+    # Lues au moment de la collecte : rien n'est calculé avant un scrape de /metrics
+    metrics.registry.gauge('chat_connected_users', 'Utilisateurs en ligne (tous workers).',
+                           lambda: ext.connected_users.count())
+    metrics.registry.gauge('chat_connected_sockets', 'Sockets Socket.IO ouvertes sur ce processus.', events.room_size)
+    metrics.registry.gauge('chat_message_writer_backlog', "Messages en attente d'insertion.",
+                           lambda: ext.message_writer.backlog)
+    metrics.registry.gauge('chat_db_pool_in_use', "Connexions du pool en cours d'utilisation, par moteur.",
+                           lambda: pool_gauge('checkedout'), labelnames=('engine',))
+    metrics.registry.gauge('chat_db_pool_size', 'Taille du pool (hors débordement), par moteur.',
+                           lambda: pool_gauge('size'), labelnames=('engine',))
+    metrics.registry.gauge('chat_image_pool_pending', 'Redimensionnements en cours ou en attente.',
+                           lambda: ext.image_pool.pending)
+    metrics.registry.gauge('chat_password_pool_pending', 'Hachages en cours ou en attente.',
+                           lambda: ext.password_pool.pending if ext.password_pool else None)
+
+
+def pool_gauge(method):
+    # QueuePool seulement : les autres pools (SQLite en mémoire…) n'ont pas ces compteurs
+    return {(database.engine_name(bind_key),): getattr(engine.pool, method, lambda: None)()
+            for bind_key, engine in db.engines.items()}
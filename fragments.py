@@ -0,0 +1,71 @@
+# fragments.py — CACHE DU HTML RENDU DE CHAQUE MESSAGE
+#
+# Le chat affiche les mêmes 50 derniers messages à chaque chargement : la
+# macro Jinja d'un message (_message.html) est rendue une fois, gardée par id
+# de message, et la page assemble les fragments par simple concaténation.
+#
+# Le texte et le fichier d'un message ne changent pas ; la version d'un
+# fragment est ce qui peut changer à son rendu (avatar de l'auteur, aperçu).
+# Un message supprimé ou un avatar modifié invalide ses fragments.
+
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+TEMPLATE = '_message.html'
+
+
+def fragment_version(msg):
+    return msg['avatar'], msg['file_preview']
+
+
+class FragmentCache:
+
+    def __init__(self, jinja_env, maxsize=2000):
+        self.jinja_env = jinja_env
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # id → (version, auteur, html)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, msg):
+        """HTML d'un message sérialisé par Message.to_dict()."""
+        version = fragment_version(msg)
+        entry = self._entries.get(msg['id'])
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(msg['id'])
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        html = self.jinja_env.get_template(TEMPLATE).module.message(msg)
+        if self.maxsize > 0 and msg['id'] is not None:
+            self._entries[msg['id']] = (version, msg['user_id'], html)
+            self._entries.move_to_end(msg['id'])
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return html
+
+    def render_all(self, messages):
+        return Markup('').join(self.render(msg) for msg in messages)
+
+    def invalidate(self, message_id):
+        self._entries.pop(message_id, None)
+
+    def invalidate_user(self, user_id):
+        """Avatar modifié : les fragments de ses messages sont à refaire."""
+        for message_id in [mid for mid, entry in self._entries.items() if entry[1] == user_id]:
+            del self._entries[message_id]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else None,
+        }
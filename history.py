@@ -0,0 +1,47 @@
+# history.py — PAGINATION PAR CURSEUR (KEYSET) SUR (timestamp, id)
+#
+# Chaque page est un parcours de l'index ix_message_timestamp_id à partir
+# du curseur : le coût ne dépend pas de la profondeur dans l'historique.
+
+import base64
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import Message
+
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(timestamp, message_id):
+    raw = f"{timestamp.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Renvoie (timestamp, id) ; ValueError si le curseur est invalide."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, message_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except Exception as e:
+        raise ValueError(f"Curseur invalide : {cursor!r}") from e
+
+
+def page_before(query, cursor=None, limit=50):
+    """Messages plus anciens que `cursor`, du plus ancien au plus récent.
+
+    Renvoie (messages, next_cursor) ; next_cursor vaut None en fin d'historique.
+    """
+    limit = max(1, limit)
+    if cursor:
+        timestamp, message_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Message.timestamp, Message.id) < (timestamp, message_id))
+
+    rows = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+
+    next_cursor = encode_cursor(rows[0].timestamp, rows[0].id) if has_more else None
+    return rows, next_cursor
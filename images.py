@@ -0,0 +1,117 @@
+# images.py — DÉRIVÉS REDIMENSIONNÉS DES AVATARS ET IMAGES DU CHAT
+#
+# Après un upload, des versions réduites (WebP) sont calculées en
+# arrière-plan ; une variante absente est générée à la première demande
+# (/media/<variante>/<chemin>) puis gardée sur disque.
+
+import os
+import tempfile
+
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow absent : on sert toujours l'original
+    Image = ImageOps = None
+
+# Variante → côté max en pixels (2x la taille affichée par les templates)
+VARIANTS = {
+    'thumb': 80,     # avatars affichés en 40px
+    'preview': 600,  # images du chat affichées en max-width:300px
+}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}  # GIF : on garde l'animation d'origine
+STATIC_PREFIX = '/static/'
+MEDIA_PREFIX = '/media/'
+
+AVAILABLE = Image is not None
+
+
+def is_resizable(url):
+    return bool(url) and url.startswith(STATIC_PREFIX) and url.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+
+
+def variant_url(url, variant):
+    """URL de la variante d'une image locale ; l'URL d'origine sinon."""
+    if variant == 'original' or not AVAILABLE or not is_resizable(url):
+        return url
+    return f'{MEDIA_PREFIX}{variant}/{url[len(STATIC_PREFIX):]}'
+
+
+def render_variant(source_path, target_path, variant):
+    """Exécuté dans un thread système (voir workers.WorkerPool)."""
+    size = VARIANTS[variant]
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if variant == 'thumb':
+            image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        else:
+            image.thumbnail((size, size), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.mode in ('LA', 'P') else 'RGB')
+
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target_path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                image.save(tmp, 'WEBP', quality=80, method=4)
+            os.replace(tmp_path, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class ImagePipeline:
+
+    def __init__(self, static_folder, derived_root, pool):
+        self.static_folder = static_folder
+        self.derived_root = derived_root
+        self.pool = pool
+
+    def _is_derived(self, path):
+        # Une variante n'est jamais une source : pas de variantes de variantes via /media/
+        root = os.path.realpath(self.derived_root)
+        return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+    def source_path(self, relative):
+        """Fichier d'origine sous static/, ou None (chemin invalide, variante, pas une image)."""
+        path = safe_join(self.static_folder, relative)
+        if path is None or self._is_derived(path) or not os.path.isfile(path) \
+                or not is_resizable(STATIC_PREFIX + relative):
+            return None
+        return path
+
+    def derived_path(self, relative, variant):
+        """Fichier de la variante sous derived_root, ou None si la source est invalide ou déjà une variante."""
+        source = safe_join(self.static_folder, relative)
+        if source is None or self._is_derived(source):
+            return None
+        return safe_join(self.derived_root, variant, relative + '.webp')
+
+    def ensure(self, relative, variant):
+        """Chemin de la variante, générée si besoin ; None si impossible."""
+        if not AVAILABLE or variant not in VARIANTS:
+            return None
+        # Chemin validé avant tout accès disque : /media/ est public (pas de ../)
+        target = self.derived_path(relative, variant)
+        if target is None:
+            return None
+        if os.path.exists(target):
+            return target
+        source = self.source_path(relative)
+        if source is None:
+            return None
+        self.pool.run(render_variant, source, target, variant)
+        return target
+
+    def schedule(self, url):
+        """Prépare toutes les variantes d'une image qui vient d'être envoyée."""
+        if not AVAILABLE or not is_resizable(url):
+            return
+        relative = url[len(STATIC_PREFIX):]
+        source = self.source_path(relative)
+        if source is None:
+            return
+        for variant in VARIANTS:
+            target = self.derived_path(relative, variant)
+            if target is not None and not os.path.exists(target):
+                self.pool.submit(render_variant, source, target, variant)
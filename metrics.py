@@ -0,0 +1,268 @@
+# metrics.py — MÉTRIQUES AU FORMAT PROMETHEUS
+#
+# Histogrammes et compteurs en mémoire du processus, rendus en texte par
+# /metrics. Côté chemin chaud, une observation = une recherche dichotomique
+# et deux additions : pas de verrou (un seul thread système sous eventlet,
+# les threads du WorkerPool n'enregistrent rien).
+#
+# Enregistré :
+#   - durée de chaque route Flask et de chaque événement Socket.IO
+#   - nombre et durée des requêtes SQL, par route / événement
+#   - attente d'une connexion et délais dépassés, par pool SQLAlchemy (primaire, réplique)
+#   - taille des diffusions (nombre de sockets destinataires)
+#   - jauges lues au moment de la collecte (clients connectés, file du writer…)
+
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+FANOUT_BUCKETS = (1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels → [compte par seau (+Inf inclus), somme]
+
+    def observe(self, value, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labelnames + ('le',), labels + (bound,)), cumulative)
+            base = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum', base, total
+            yield f'{self.name}_count', base, cumulative
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, collect, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect  # () → valeur lue à chaque collecte ({labels: valeur} si labelnames)
+
+    def samples(self):
+        try:
+            value = self.collect()
+        except Exception as e:
+            print(f"Erreur métrique {self.name} : {e}")
+            return
+        values = value if self.labelnames else {(): value}
+        for labels, value in (values or {}).items():
+            if value is not None:
+                yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        # Même nom : remplacée (create_app() peut être appelée plusieurs fois)
+        self._metrics = [m for m in self._metrics if m.name != metric.name]
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def gauge(self, name, documentation, collect, labelnames=()):
+        return self.register(Gauge(name, documentation, collect, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    'chat_http_request_seconds', 'Durée des requêtes HTTP par route.', ('endpoint', 'method', 'status'))
+socketio_event_seconds = registry.histogram(
+    'chat_socketio_event_seconds', 'Durée des gestionnaires Socket.IO.', ('event',))
+db_query_seconds = registry.histogram(
+    'chat_db_query_seconds', 'Durée des requêtes SQL.', ('context',))
+db_queries_per_unit = registry.histogram(
+    'chat_db_queries_per_request', 'Requêtes SQL par requête HTTP / événement Socket.IO.',
+    ('context',), buckets=COUNT_BUCKETS)
+db_pool_wait_seconds = registry.histogram(
+    'chat_db_pool_checkout_wait_seconds', "Attente d'une connexion dans le pool SQLAlchemy.", ('engine',))
+db_pool_timeouts = registry.counter(
+    'chat_db_pool_timeouts_total', 'Connexions refusées après DB_POOL_TIMEOUT secondes (pool épuisé).', ('engine',))
+broadcast_recipients = registry.histogram(
+    'chat_broadcast_recipients', 'Sockets destinataires par émission.', ('event',), buckets=FANOUT_BUCKETS)
+messages_sent = registry.counter('chat_messages_sent_total', 'Messages envoyés.', ('kind',))
+rate_limited = registry.counter('chat_rate_limited_total', 'Actions refusées par limite de débit.',
+                                ('limit', 'scope'))
+slow_consumer_actions = registry.counter('chat_slow_consumer_actions_total',
+                                         'Clients lents purgés ou déconnectés.', ('policy',))
+
+
+# ------------------------------------------------------------ contexte courant
+
+def _begin(context):
+    g._metrics_context = context
+    g._metrics_queries = 0
+
+
+def _end():
+    context = g.pop('_metrics_context', None)
+    if context is not None:
+        db_queries_per_unit.observe(g.pop('_metrics_queries', 0), context)
+
+
+def _current_context():
+    if has_app_context():
+        return g.get('_metrics_context', 'background')
+    return 'background'
+
+
+# ------------------------------------------------------------ Flask / Socket.IO
+
+def timed_event(name):
+    """Décorateur des gestionnaires Socket.IO (à placer sous @socketio.on)."""
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            _begin('socket:' + name)
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                socketio_event_seconds.observe(time.perf_counter() - started, name)
+                _end()
+        return wrapper
+    return decorator
+
+
+def observe_broadcast(event_name, recipients):
+    broadcast_recipients.observe(recipients, event_name)
+
+
+def init_app(app):
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        _begin(request.endpoint or 'not_found')
+
+    @app.after_request
+    def _stop_timer(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            http_request_seconds.observe(time.perf_counter() - started,
+                                         request.endpoint or 'not_found', request.method, response.status_code)
+            _end()
+        return response
+
+
+# ------------------------------------------------------------ SQLAlchemy
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get('_metrics_started')
+    if not stack:
+        return
+    db_query_seconds.observe(time.perf_counter() - stack.pop(), _current_context())
+    if has_app_context() and '_metrics_queries' in g:
+        g._metrics_queries += 1
+
+
+def name_engine(engine, name):
+    # Étiquette `engine` de ses métriques de pool (voir database.engine_name)
+    engine._metrics_name = name
+
+
+@event.listens_for(Engine, 'engine_connect')
+def _engine_connect(connection):
+    # Première connexion d'un moteur : son pool est instrumenté à ce moment-là
+    pool = connection.engine.pool
+    if not getattr(pool, '_metrics_instrumented', False):
+        _instrument_pool(pool, getattr(connection.engine, '_metrics_name', 'primary'))
+
+
+def _instrument_pool(pool, name):
+    # Pas d'événement « avant checkout » dans SQLAlchemy : on chronomètre
+    # _do_get, qui attend une connexion libre quand le pool est plein
+    do_get = pool._do_get
+    pool._metrics_instrumented = True
+
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        except PoolTimeout:
+            db_pool_timeouts.inc(name)
+            raise
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - started, name)
+
+    pool._do_get = timed_do_get
+
+
+def render():
+    return registry.render()
@@ -0,0 +1,32 @@
+"""Content-addressed stored files with reference counts
+
+Revision ID: 4f0b6d2e8a73
+Revises: e2f58a3c91b6
+Create Date: 2026-10-18 13:04:17.882391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f0b6d2e8a73'
+down_revision = 'e2f58a3c91b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stored_file',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('url', sa.String(length=200), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256'),
+        sa.UniqueConstraint('url')
+    )
+
+
+def downgrade():
+    op.drop_table('stored_file')
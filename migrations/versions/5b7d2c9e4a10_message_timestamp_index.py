@@ -0,0 +1,25 @@
+"""Index (timestamp, id) for keyset history pagination
+
+Revision ID: 5b7d2c9e4a10
+Revises: 1e32f8d2ec3e
+Create Date: 2026-10-18 10:12:44.318207
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7d2c9e4a10'
+down_revision = '1e32f8d2ec3e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.create_index('ix_message_timestamp_id', ['timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_timestamp_id')
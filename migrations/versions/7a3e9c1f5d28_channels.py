@@ -0,0 +1,69 @@
+"""Named channels, channel membership and message.channel_id
+
+Revision ID: 7a3e9c1f5d28
+Revises: 4f0b6d2e8a73
+Create Date: 2026-10-18 15:42:09.530218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3e9c1f5d28'
+down_revision = '4f0b6d2e8a73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('channel',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.create_table('channel_member',
+        sa.Column('channel_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('joined_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['channel_id'], ['channel.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('channel_id', 'user_id')
+    )
+    with op.batch_alter_table('channel_member', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_channel_member_user_id'), ['user_id'], unique=False)
+
+    # ADD COLUMN simple (pas de batch) : sous SQLite, recréer `message` effacerait les triggers FTS,
+    # et la clé étrangère n'y est posée que par create_all()
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    op.add_column('message', sa.Column('channel_id', sa.Integer(), nullable=True))
+    if not sqlite:
+        op.create_foreign_key('fk_message_channel_id_channel', 'message', 'channel', ['channel_id'], ['id'])
+
+    # Salon par défaut : tout l'historique public y est rangé
+    op.execute("INSERT INTO channel (name, created_at) VALUES ('general', CURRENT_TIMESTAMP)")
+    op.execute(
+        "UPDATE message SET channel_id = (SELECT id FROM channel WHERE name = 'general') "
+        "WHERE is_private = false"
+    )
+
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.create_index('ix_message_channel_timestamp', ['channel_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_channel_timestamp')
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('fk_message_channel_id_channel', 'message', type_='foreignkey')
+    op.drop_column('message', 'channel_id')
+
+    with op.batch_alter_table('channel_member', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_channel_member_user_id'))
+
+    op.drop_table('channel_member')
+    op.drop_table('channel')
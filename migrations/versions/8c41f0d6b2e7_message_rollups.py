@@ -0,0 +1,51 @@
+"""Daily and per-user message count rollups
+
+Revision ID: 8c41f0d6b2e7
+Revises: 5b7d2c9e4a10
+Create Date: 2026-10-18 11:02:09.562113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41f0d6b2e7'
+down_revision = '5b7d2c9e4a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_message_count',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('user_message_count',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('user_message_count', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_message_count_count'), ['count'], unique=False)
+
+    # Remplissage initial depuis l'historique existant
+    day = 'date(timestamp)' if op.get_bind().dialect.name == 'sqlite' else 'CAST(timestamp AS DATE)'
+    op.execute(
+        f"INSERT INTO daily_message_count (day, count) "
+        f"SELECT {day}, COUNT(id) FROM message WHERE timestamp IS NOT NULL GROUP BY {day}"
+    )
+    op.execute(
+        "INSERT INTO user_message_count (user_id, count) "
+        "SELECT user_id, COUNT(id) FROM message WHERE user_id IS NOT NULL GROUP BY user_id"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user_message_count', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_message_count_count'))
+
+    op.drop_table('user_message_count')
+    op.drop_table('daily_message_count')
@@ -0,0 +1,31 @@
+"""Uploaders of stored files
+
+Revision ID: 9e4b2a7c1d36
+Revises: d3a9f27c5e81
+Create Date: 2026-10-18 19:02:51.604127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b2a7c1d36'
+down_revision = 'd3a9f27c5e81'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('file_upload',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['sha256'], ['stored_file.sha256'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('sha256', 'user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('file_upload')
@@ -0,0 +1,36 @@
+"""Background moderation jobs
+
+Revision ID: b6d14e8f2a95
+Revises: 7a3e9c1f5d28
+Create Date: 2026-10-18 17:06:51.204377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d14e8f2a95'
+down_revision = '7a3e9c1f5d28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('moderation_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('targets', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('deleted', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(length=300), nullable=True),
+        sa.Column('requested_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('moderation_job')
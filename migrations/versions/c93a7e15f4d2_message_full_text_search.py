@@ -0,0 +1,56 @@
+"""Full-text search index on message text
+
+Revision ID: c93a7e15f4d2
+Revises: 8c41f0d6b2e7
+Create Date: 2026-10-18 11:47:31.904415
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c93a7e15f4d2'
+down_revision = '8c41f0d6b2e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5("
+            "message, content='message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN "
+            "INSERT INTO message_fts(rowid, message) VALUES (new.id, new.message); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN "
+            "INSERT INTO message_fts(message_fts, rowid, message) VALUES ('delete', old.id, old.message); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF message ON message BEGIN "
+            "INSERT INTO message_fts(message_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+            "INSERT INTO message_fts(rowid, message) VALUES (new.id, new.message); END"
+        )
+        op.execute("INSERT INTO message_fts(message_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE message ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(message, ''))) STORED"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_message_search_vector ON message USING GIN (search_vector)")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS message_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS message_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS message_fts_ai")
+        op.execute("DROP TABLE IF EXISTS message_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_message_search_vector")
+        op.execute("ALTER TABLE message DROP COLUMN IF EXISTS search_vector")
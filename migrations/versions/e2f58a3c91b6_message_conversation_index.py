@@ -0,0 +1,25 @@
+"""Index (recipient_id, user_id, timestamp) for private conversations
+
+Revision ID: e2f58a3c91b6
+Revises: c93a7e15f4d2
+Create Date: 2026-10-18 12:25:53.117642
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f58a3c91b6'
+down_revision = 'c93a7e15f4d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.create_index('ix_message_conversation', ['recipient_id', 'user_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_conversation')
@@ -3,9 +3,11 @@ from flask import url_for
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from database import RoutingSession
+from images import variant_url
+from passwords import hash_password, verify_password
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # Réplique de lecture : voir database.py
 
 class User(db.Model, UserMixin):  # ← Hérite de UserMixin
     id = db.Column(db.Integer, primary_key=True)
@@ -15,19 +17,28 @@ class User(db.Model, UserMixin):  # ← Hérite de UserMixin
     avatar = db.Column(db.String(200), default="https://via.placeholder.com/40")
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
     def to_dict(self):
         return {
             'id': self.id,
             'username': self.username,
-            'avatar': self.avatar
+            'avatar': variant_url(self.avatar, 'thumb')
         }
 
 class Message(db.Model):
+    __table_args__ = (
+        # Pagination keyset de l'historique (voir history.py)
+        db.Index('ix_message_timestamp_id', 'timestamp', 'id'),
+        # Historique d'une conversation privée (/api/conversations/<id>)
+        db.Index('ix_message_conversation', 'recipient_id', 'user_id', 'timestamp'),
+        # Historique d'un salon, même pagination keyset (voir channels.py)
+        db.Index('ix_message_channel_timestamp', 'channel_id', 'timestamp', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), nullable=False)
     message = db.Column(db.String(500), nullable=False)
@@ -36,10 +47,14 @@ class Message(db.Model):
     is_private = db.Column(db.Boolean, default=False)
     recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    channel_id = db.Column(db.Integer, db.ForeignKey('channel.id'), nullable=True)  # None pour un message privé
 
-    def to_dict(self):
-        user = User.query.get(self.user_id)
-        recipient = User.query.get(self.recipient_id) if self.recipient_id else None
+    def to_dict(self, users=None):
+        # `users` : {id: User} déjà chargé (voir serialize_messages) pour éviter le N+1
+        if users is None:
+            users = load_users([self])
+        user = users.get(self.user_id)
+        recipient = users.get(self.recipient_id) if self.recipient_id else None
         return {
             'id': self.id,
             'username': self.username,
@@ -47,8 +62,96 @@ class Message(db.Model):
             'timestamp': self.timestamp.strftime('%H:%M:%S'),
             'user_id': self.user_id,
             'file_url': self.file_url,  # ← Ajouté
-            'avatar': user.avatar if user else url_for('static', filename='uploads/avatars/default.png'),
+            'file_preview': variant_url(self.file_url, 'preview'),  # Image réduite pour le fil
+            'avatar': variant_url(user.avatar, 'thumb') if user else url_for('static', filename='uploads/avatars/default.png'),
             'is_private': self.is_private,
             'recipient_id': self.recipient_id,
-            'recipient_username': recipient.username if recipient else None
-        }
\ No newline at end of file
+            'recipient_username': recipient.username if recipient else None,
+            'channel_id': self.channel_id
+        }
+
+
+def load_users(messages):
+    """Auteurs et destinataires d'une liste de messages, en une seule requête IN."""
+    ids = {msg.user_id for msg in messages} | {msg.recipient_id for msg in messages}
+    ids.discard(None)
+    if not ids:
+        return {}
+    return {user.id: user for user in User.query.filter(User.id.in_(ids))}
+
+
+def serialize_messages(messages):
+    users = load_users(messages)
+    return [msg.to_dict(users) for msg in messages]
+
+
+# Salons nommés (voir channels.py) ; le salon par défaut n'a pas besoin d'adhésion
+class Channel(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name}
+
+
+class ChannelMember(db.Model):
+    channel_id = db.Column(db.Integer, db.ForeignKey('channel.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, index=True)
+    joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Agrégats maintenus à l'écriture (voir rollups.py) : la page stats ne parcourt plus `message`
+class DailyMessageCount(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UserMessageCount(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+
+# Fichier stocké par contenu (voir storage.py) ; `refcount` = messages + avatars qui y renvoient
+class StoredFile(db.Model):
+    sha256 = db.Column(db.String(64), primary_key=True)
+    url = db.Column(db.String(200), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Qui a envoyé quel fichier : seul l'auteur d'un upload peut le joindre à un message
+class FileUpload(db.Model):
+    sha256 = db.Column(db.String(64), db.ForeignKey('stored_file.sha256'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Suppression de l'administrateur exécutée par lots en arrière-plan (voir moderation.py)
+class ModerationJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)      # 'users' ou 'messages'
+    targets = db.Column(db.Text, nullable=False)          # ids visés, en JSON
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, running, done, failed
+    total = db.Column(db.Integer, nullable=False, default=0)   # messages à supprimer (estimation au départ)
+    deleted = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(300), nullable=True)
+    requested_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # dernier lot terminé : bail du worker qui la fait avancer
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'total': self.total,
+            'deleted': self.deleted,
+            'progress': 1 if self.status == 'done' else (round(min(self.deleted / self.total, 1), 3) if self.total else 0),
+            'error': self.error,
+            'created_at': self.created_at.isoformat(timespec='seconds') if self.created_at else None,
+            'finished_at': self.finished_at.isoformat(timespec='seconds') if self.finished_at else None
+        }
@@ -0,0 +1,209 @@
+# moderation.py — SUPPRESSIONS DE L'ADMINISTRATEUR, PAR LOTS EN ARRIÈRE-PLAN
+#
+# Supprimer un utilisateur, c'est aussi supprimer ses messages (envoyés, et
+# privés reçus) : dans la transaction d'une requête, un gros historique
+# verrouillerait `message` et bloquerait le worker. La route enregistre une
+# tâche (ModerationJob) et répond tout de suite ; un green thread supprime
+# ensuite les messages par lots de MODERATION_BATCH_SIZE, chacun dans une
+# courte transaction qui met aussi à jour les agrégats des stats et les
+# références aux fichiers. L'avancement est en base : n'importe quel worker
+# répond à /admin/api/moderation/<id>.
+#
+# Après chaque lot : caches (fragments, tampons récents, compteurs) et écrans
+# des clients connectés. Après chaque compte : cache d'identité, présence et
+# onglets ouverts. Les fichiers devenus orphelins sont supprimés à la fin
+# (passé le délai de grâce de FileStore.collect_garbage, sinon au prochain
+# `flask gc-uploads`).
+# Les messages déjà archivés (retention.py) sont retirés de l'archive.
+#
+# Chaque lot terminé renouvelle le bail de la tâche (heartbeat_at). Si son
+# worker s'arrête, la tâche reste « running » : passé MODERATION_LEASE
+# secondes sans lot, un autre worker la reprend (watch) là où elle en était ;
+# les lots sont idempotents.
+
+import json
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, delete, or_, select, update
+
+import extensions as ext
+import rollups
+from models import db, Channel, ChannelMember, FileUpload, Message, ModerationJob, User, UserMessageCount
+from retention import purge_archive
+
+KINDS = ('users', 'messages')
+PROTECTED_USERS = {1}  # L'administrateur
+COLUMNS = ['id', 'user_id', 'recipient_id', 'channel_id', 'is_private', 'timestamp', 'file_url']
+
+
+class Moderator:
+
+    def __init__(self, batch_size=500, pause=0.05, spawn=None, sleep=time.sleep,
+                 on_messages_deleted=None, on_user_deleted=None, lease=60):
+        self.batch_size = batch_size
+        self.pause = pause  # entre deux lots : laisse passer le trafic
+        self.lease = lease  # secondes sans lot terminé avant qu'un autre worker reprenne la tâche
+        self.spawn = spawn
+        self.sleep = sleep
+        self.on_messages_deleted = on_messages_deleted or (lambda rows: None)
+        self.on_user_deleted = on_user_deleted or (lambda user_id: None)
+
+    def submit(self, kind, ids, requested_by=None):
+        """Enregistre une tâche et la lance en arrière-plan ; ValueError si la demande est invalide."""
+        if kind not in KINDS:
+            raise ValueError('Type de suppression inconnu')
+        try:
+            ids = sorted({int(i) for i in ids})
+        except (TypeError, ValueError):
+            raise ValueError('Identifiants invalides')
+        if not ids:
+            raise ValueError('Aucune sélection')
+        if kind == 'users' and PROTECTED_USERS.intersection(ids):
+            raise ValueError("L'administrateur ne peut pas être supprimé")
+
+        job = ModerationJob(kind=kind, targets=json.dumps(ids), requested_by=requested_by,
+                            total=self._estimate(kind, ids), status='pending', deleted=0)
+        db.session.add(job)
+        db.session.commit()
+        self.spawn(self.run, current_app._get_current_object(), job.id)
+        return job
+
+    @staticmethod
+    def _estimate(kind, ids):
+        # Messages envoyés, lus dans les agrégats (les privés reçus s'y ajoutent : progression plafonnée)
+        if kind == 'messages':
+            return len(ids)
+        return db.session.query(db.func.coalesce(db.func.sum(UserMessageCount.count), 0)).filter(
+            UserMessageCount.user_id.in_(ids)).scalar()
+
+    def _stale_before(self):
+        return datetime.utcnow() - timedelta(seconds=self.lease)
+
+    def _claim(self, job_id):
+        """Prend la tâche si aucun worker ne la fait avancer ; True si elle est à nous."""
+        claimed = db.session.execute(update(ModerationJob).where(
+            ModerationJob.id == job_id,
+            ModerationJob.status.in_(('pending', 'running')),
+            or_(ModerationJob.heartbeat_at.is_(None), ModerationJob.heartbeat_at < self._stale_before())
+        ).values(status='running', heartbeat_at=datetime.utcnow())).rowcount
+        db.session.commit()
+        return claimed == 1
+
+    def resume(self, app):
+        """Relance les tâches abandonnées (worker arrêté en cours de route) ; renvoie leurs ids."""
+        with app.app_context():
+            stale = self._stale_before()
+            ids = db.session.execute(select(ModerationJob.id).where(
+                ModerationJob.status.in_(('pending', 'running')),
+                or_(ModerationJob.heartbeat_at < stale,
+                    and_(ModerationJob.heartbeat_at.is_(None), ModerationJob.created_at < stale))
+            )).scalars().all()
+            db.session.remove()
+        for job_id in ids:
+            self.spawn(self.run, app, job_id)
+        return ids
+
+    def watch(self, app, interval):
+        while True:
+            try:
+                resumed = self.resume(app)
+                if resumed:
+                    print(f"🧹 Tâche(s) de modération reprise(s) : {resumed}")
+            except Exception as e:
+                print(f"Erreur reprise des tâches de modération : {e}")
+            self.sleep(interval)
+
+    def run(self, app, job_id):
+        with app.app_context():
+            if not self._claim(job_id):
+                db.session.remove()
+                return
+            try:
+                job = db.session.get(ModerationJob, job_id)
+                ids = json.loads(job.targets)
+                targets = set(ids)
+                if job.kind == 'users':
+                    condition = or_(Message.user_id.in_(ids), Message.recipient_id.in_(ids))
+                    self._delete_messages(job, condition)
+                    self._purge_archive(job, lambda row: row['user_id'] in targets or row['recipient_id'] in targets)
+                    # Dernier passage : messages insérés entre-temps par le writer
+                    self._delete_messages(job, condition)
+                    for user_id in ids:
+                        self._delete_user(job, user_id)
+                else:
+                    self._delete_messages(job, Message.id.in_(ids))
+                    self._purge_archive(job, lambda row: row['id'] in targets)
+                job.status = 'done'
+            except Exception as e:
+                db.session.rollback()
+                job = db.session.get(ModerationJob, job_id)
+                job.status = 'failed'
+                job.error = str(e)[:300]
+                print(f"Erreur modération (tâche {job_id}) : {e}")
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            try:
+                ext.file_store.collect_garbage()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erreur nettoyage des fichiers : {e}")
+            finally:
+                db.session.remove()
+
+    def _delete_messages(self, job, condition):
+        # Parcours par id croissant : chaque lot reprend où le précédent s'est arrêté
+        last_id = 0
+        while True:
+            batch = Message.query.filter(condition, Message.id > last_id).order_by(
+                Message.id).limit(self.batch_size).all()
+            if not batch:
+                return
+            rows = [{column: getattr(msg, column) for column in COLUMNS} for msg in batch]
+            last_id = rows[-1]['id']
+            rollups.forget_messages(rows)
+            ext.file_store.release(row['file_url'] for row in rows)
+            db.session.execute(delete(Message).where(Message.id.in_([row['id'] for row in rows])))
+            job.deleted += len(rows)
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+            self._messages_deleted(rows)
+            self.sleep(self.pause)
+
+    def _purge_archive(self, job, predicate):
+        removed = purge_archive(ext.message_archive, predicate, sleep=self.sleep)
+        if not removed:
+            return
+        rows = [{column: row.get(column) for column in COLUMNS} for row in removed]
+        rollups.forget_messages(rows)
+        ext.file_store.release(row['file_url'] for row in rows)
+        job.deleted += len(rows)
+        job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+        self._messages_deleted(rows)
+
+    def _messages_deleted(self, rows):
+        for row in rows:
+            ext.fragments.invalidate(row['id'])
+        ext.recent_messages.remove({row['id'] for row in rows})
+        ext.counters.incr('messages', -len(rows))
+        ext.counters.incr('private_messages', -sum(1 for row in rows if row['is_private']))
+        self.on_messages_deleted(rows)
+
+    def _delete_user(self, job, user_id):
+        user = db.session.get(User, user_id)
+        if user is None:
+            return
+        job.heartbeat_at = datetime.utcnow()
+        ChannelMember.query.filter_by(user_id=user_id).delete()
+        db.session.execute(update(Channel).where(Channel.created_by == user_id).values(created_by=None))
+        db.session.execute(delete(UserMessageCount).where(UserMessageCount.user_id == user_id))
+        db.session.execute(delete(FileUpload).where(FileUpload.user_id == user_id))
+        ext.file_store.release([user.avatar])
+        db.session.delete(user)
+        db.session.commit()
+        ext.counters.incr('users', -1)
+        ext.user_cache.invalidate(user_id)
+        ext.fragments.invalidate_user(user_id)
+        self.on_user_deleted(user_id)
@@ -0,0 +1,33 @@
+# passwords.py — HACHAGE DES MOTS DE PASSE HORS DU HUB EVENTLET
+#
+# generate/check_password_hash coûtent des dizaines de ms de CPU : exécutés
+# dans la green thread de la requête, ils gèlent la diffusion des messages
+# pour tout le monde. Ici ils passent par un WorkerPool borné ; au-delà de la
+# file d'attente, PoolFull est levée (la vue répond « serveur occupé »).
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from workers import WorkerPool
+
+pool = None  # Sans pool (scripts, tests) : hachage direct
+
+
+def init_pool(size, max_queue):
+    """size=0 : hachage dans la green thread appelante (ancien comportement)."""
+    global pool
+    pool = WorkerPool('passwords', size=size, max_queue=max_queue) if size > 0 else None
+    return pool
+
+
+def _run(fn, *args):
+    if pool is None:
+        return fn(*args)
+    return pool.run(fn, *args)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password)
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
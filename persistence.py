@@ -0,0 +1,326 @@
+# persistence.py — ÉCRITURE DIFFÉRÉE (WRITE-BEHIND) DES MESSAGES
+#
+# Les messages reçoivent un id et sont diffusés immédiatement ; une green
+# thread les insère ensuite dans la table `message` par lots (multi-row
+# INSERT), bornés en taille et en temps. Un lot qui échoue encore après
+# les tentatives est réécrit ligne par ligne : les lignes refusées par la
+# base partent dans MESSAGE_REJECT_FILE, le reste est inséré.
+
+import atexit
+import collections
+import contextlib
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func, insert, text
+from sqlalchemy.exc import DataError, IntegrityError
+
+from models import db, Message, User
+
+
+class MessageIdAllocator:
+    """Réserve des ids de messages par blocs (un aller-retour DB par bloc)."""
+
+    def __init__(self, block_size=100, floor=None):
+        self.block_size = block_size
+        self.floor = floor  # floor() : plus grand id déjà attribué hors de la table (archive)
+        self._ids = collections.deque()
+        self._next = None
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            if not self._ids:
+                self._reserve()
+            return self._ids.popleft()
+
+    def _reserve(self):
+        engine = db.engine
+        if engine.dialect.name == 'postgresql':
+            # La séquence SERIAL est partagée entre workers : pas de collision
+            with engine.connect() as conn:
+                ids = conn.execute(
+                    text("SELECT nextval(pg_get_serial_sequence('message', 'id')) "
+                         "FROM generate_series(1, :n)"),
+                    {'n': self.block_size}
+                ).scalars().all()
+            self._ids.extend(ids)
+            return
+
+        # SQLite : un seul processus écrit (sinon init_app force le mode sync), un
+        # compteur local suffit. Il repart au-dessus des messages archivés : un id
+        # ne doit jamais resservir
+        if self._next is None:
+            with engine.connect() as conn:
+                highest = conn.execute(db.select(func.max(Message.id))).scalar() or 0
+            self._next = max(highest, self.floor() if self.floor else 0) + 1
+        self._ids.extend(range(self._next, self._next + self.block_size))
+        self._next += self.block_size
+
+
+class MessageWriter:
+    """File d'attente + green thread qui persiste les messages par lots."""
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.socketio = None
+        self.allocator = None
+        self._queue = queue.Queue()
+        self._batch = []  # Lot en cours (retiré de la file, pas encore écrit) : repris par shutdown()
+        self._lock = threading.Lock()
+        self._started = False
+        self._stopping = False
+        self._persist_hooks = []
+        self.stats = {'queued': 0, 'flushed': 0, 'batches': 0, 'spilled': 0, 'sync_fallbacks': 0,
+                      'dropped': 0, 'rejected': 0, 'flush_seconds': 0.0}
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        app.config.setdefault('MESSAGE_WRITE_MODE', os.environ.get('MESSAGE_WRITE_MODE', 'async'))
+        app.config.setdefault('MESSAGE_BATCH_SIZE', int(os.environ.get('MESSAGE_BATCH_SIZE', 200)))
+        app.config.setdefault('MESSAGE_FLUSH_INTERVAL', float(os.environ.get('MESSAGE_FLUSH_INTERVAL', 0.05)))
+        app.config.setdefault('MESSAGE_QUEUE_MAX', int(os.environ.get('MESSAGE_QUEUE_MAX', 10000)))
+        app.config.setdefault('MESSAGE_SPILL_FILE', os.path.join(app.instance_path, 'pending_messages.jsonl'))
+        app.config.setdefault('MESSAGE_REJECT_FILE', os.path.join(app.instance_path, 'rejected_messages.jsonl'))
+        # Les ids SQLite viennent d'un compteur propre au processus : à plusieurs workers ils
+        # se chevaucheraient. L'écriture synchrone laisse la base les attribuer
+        if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') and \
+                int(os.environ.get('WEB_CONCURRENCY', 1)) > 1 and app.config['MESSAGE_WRITE_MODE'] != 'sync':
+            print("⚠️ SQLite avec WEB_CONCURRENCY > 1 : MESSAGE_WRITE_MODE forcé à sync.")
+            app.config['MESSAGE_WRITE_MODE'] = 'sync'
+
+        self.app = app
+        self.socketio = socketio
+        self.allocator = MessageIdAllocator()
+        app.extensions['message_writer'] = self
+        atexit.register(self.shutdown)
+
+    def on_persist(self, hook):
+        """`hook(rows)` est appelé dans la transaction qui insère `rows` (agrégats, références…)."""
+        self._persist_hooks.append(hook)
+        return hook
+
+    def _run_hooks(self, rows):
+        for hook in self._persist_hooks:
+            hook(rows)
+
+    @property
+    def backlog(self):
+        """Messages en attente d'insertion."""
+        return self._queue.qsize()
+
+    def pending(self, predicate):
+        """Lignes soumises pas encore insérées (lot en cours + file) qui vérifient `predicate`."""
+        # Pas de verrou dans la Queue d'eventlet : la copie se fait sans céder la main
+        with getattr(self._queue, 'mutex', None) or contextlib.nullcontext():
+            queued = list(self._queue.queue)
+        return [row for row in self._batch + queued if row is not None and predicate(row)]
+
+    @property
+    def synchronous(self):
+        return self.app.config['MESSAGE_WRITE_MODE'] == 'sync'
+
+    # ----------------------------------------------------------------- écriture
+
+    def submit(self, **fields):
+        """Enregistre un message et renvoie ses colonnes (id et timestamp inclus)."""
+        row = dict(fields, timestamp=datetime.utcnow())
+        if self.synchronous:
+            message = Message(**row)
+            db.session.add(message)
+            self._run_hooks([row])
+            db.session.commit()
+            row['id'] = message.id
+            return row
+
+        # Les ids sont toujours pris dans l'allocateur pour ne pas croiser un bloc réservé
+        row['id'] = self.allocator.next_id()
+
+        # File pleine ou arrêt en cours → on retombe sur un commit direct
+        if self._stopping or self._queue.qsize() >= self.app.config['MESSAGE_QUEUE_MAX']:
+            self.stats['sync_fallbacks'] += 1
+            db.session.add(Message(**row))
+            self._run_hooks([row])
+            db.session.commit()
+            return row
+
+        self._ensure_started()
+        self._queue.put(row)
+        self.stats['queued'] += 1
+        return row
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if not self._started:
+                self._started = True
+                self.socketio.start_background_task(self._run)
+
+    # ------------------------------------------------------------ green thread
+
+    def _run(self):
+        with self.app.app_context():
+            self.replay_spill()
+        while not self._stopping:
+            self._collect()
+            if self._batch and not self._stopping:
+                with self.app.app_context():
+                    self._flush(self._batch)
+                self._batch = []
+
+    def _collect(self):
+        # Le lot reste sur le writer (self._batch) jusqu'à son écriture
+        first = self._queue.get()
+        if first is None:
+            return
+        self._batch = [first]
+        deadline = time.monotonic() + self.app.config['MESSAGE_FLUSH_INTERVAL']
+        while len(self._batch) < self.app.config['MESSAGE_BATCH_SIZE']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                row = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if row is None:
+                break
+            self._batch.append(row)
+
+    def _flush(self, batch, retries=3):
+        for attempt in range(retries):
+            started = time.perf_counter()
+            try:
+                db.session.execute(insert(Message), batch)
+                self._run_hooks(batch)
+                db.session.commit()
+                self.stats['flushed'] += len(batch)
+                self.stats['batches'] += 1
+                self.stats['flush_seconds'] += time.perf_counter() - started
+                return True
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erreur flush messages (tentative {attempt + 1}) : {e}")
+                batch = self._without_deleted_users(batch)
+                if not batch:
+                    return True
+                time.sleep(0.1 * 2 ** attempt)
+            finally:
+                db.session.remove()
+        # Le lot échoue toujours : ligne par ligne, une ligne invalide ne bloque plus les autres
+        return self._flush_rows(batch)
+
+    def _flush_rows(self, batch):
+        for index, row in enumerate(batch):
+            try:
+                db.session.execute(insert(Message), [row])
+                self._run_hooks([row])
+                db.session.commit()
+                self.stats['flushed'] += 1
+            except (DataError, IntegrityError) as e:
+                # Refusée par la base elle-même : mise de côté, jamais rejouée
+                db.session.rollback()
+                print(f"Message {row['id']} refusé par la base : {e}")
+                self._write_rows(self.app.config['MESSAGE_REJECT_FILE'], [row])
+                self.stats['rejected'] += 1
+            except Exception as e:
+                # Base indisponible : cette ligne et les suivantes partent sur disque
+                db.session.rollback()
+                print(f"Erreur écriture message {row['id']} : {e}")
+                self._spill(batch[index:])
+                return False
+            finally:
+                db.session.remove()
+        return True
+
+    def _without_deleted_users(self, batch):
+        # Auteur ou destinataire supprimé depuis l'envoi (moderation.py, n'importe quel
+        # worker) : la clé étrangère ferait échouer tout le lot, ces messages sont abandonnés
+        ids = {row[column] for row in batch for column in ('user_id', 'recipient_id')} - {None}
+        try:
+            existing = set(db.session.execute(db.select(User.id).where(User.id.in_(ids))).scalars())
+        except Exception:
+            db.session.rollback()
+            return batch  # Base indisponible : on réessaie le lot tel quel
+        existing.add(None)
+        kept = [row for row in batch if row['user_id'] in existing and row['recipient_id'] in existing]
+        if len(kept) < len(batch):
+            self.stats['dropped'] += len(batch) - len(kept)
+            print(f"{len(batch) - len(kept)} message(s) d'utilisateurs supprimés abandonné(s).")
+        return kept
+
+    # -------------------------------------------------------- secours durable
+
+    def _spill(self, batch):
+        self._write_rows(self.app.config['MESSAGE_SPILL_FILE'], batch)
+        self.stats['spilled'] += len(batch)
+
+    def _write_rows(self, path, rows):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(dict(row, timestamp=row['timestamp'].isoformat())) + '\n')
+
+    def replay_spill(self):
+        """Réinsère les messages sauvegardés sur disque lors d'un arrêt précédent."""
+        path = self.app.config['MESSAGE_SPILL_FILE']
+        if not os.path.exists(path):
+            return 0
+        pending = os.path.join(os.path.dirname(path), f'.replay-{os.getpid()}.jsonl')
+        os.replace(path, pending)
+        with open(pending, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        for row in rows:
+            row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+
+        # Ignore les lignes déjà insérées (arrêt entre commit et suppression du fichier)
+        ids = [row['id'] for row in rows]
+        existing = set()
+        for start in range(0, len(ids), 500):
+            existing.update(db.session.execute(
+                db.select(Message.id).where(Message.id.in_(ids[start:start + 500]))
+            ).scalars())
+        rows = [row for row in rows if row['id'] not in existing]
+
+        size = self.app.config['MESSAGE_BATCH_SIZE']
+        ok = all(self._flush(rows[start:start + size]) for start in range(0, len(rows), size))
+        os.remove(pending)
+        if ok and rows:
+            print(f"✅ {len(rows)} message(s) en attente réinsérés.")
+        return len(rows)
+
+    def shutdown(self):
+        """Écrit de façon synchrone (atexit) le lot en cours et la file ; ce qui échoue part sur disque.
+
+        Un lot interrompu en plein flush peut être réécrit ici : l'insertion
+        échoue (ids déjà présents), il part sur disque et replay_spill()
+        ignore au prochain démarrage les lignes déjà insérées.
+        """
+        if self.app is None or self._stopping:
+            return
+        self._stopping = True
+        rows, self._batch = self._batch, []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not None:
+                rows.append(row)
+        self._queue.put(None)
+        if not rows:
+            return
+        try:
+            with self.app.app_context():
+                size = self.app.config['MESSAGE_BATCH_SIZE']
+                for start in range(0, len(rows), size):
+                    self._flush(rows[start:start + size], retries=1)
+        except Exception as e:
+            print(f"Erreur arrêt writer : {e}")
+            self._spill(rows)
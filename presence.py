@@ -0,0 +1,463 @@
+# presence.py — REGISTRE DES UTILISATEURS EN LIGNE, PARTAGÉ ENTRE WORKERS
+#
+# `memory://` garde l'état dans le processus (un seul worker, tests) ;
+# `redis://...` le partage entre tous les workers gunicorn / nœuds.
+#
+# Protocole par deltas : un instantané complet à la première connexion,
+# puis seulement `presence_join` / `presence_leave`. Chaque delta porte un
+# numéro de séquence : un client qui se reconnecte ne reçoit que ce qu'il a
+# manqué. Un départ n'est annoncé qu'après PRESENCE_LEAVE_GRACE secondes
+# sans session, ce qui absorbe les déconnexions/reconnexions rapides.
+#
+# Tempête (plus de STORM_CHANGES arrivées/départs en STORM_WINDOW secondes,
+# par ex. tous les clients qui reviennent après une coupure plus longue que
+# le délai de grâce) : les deltas par utilisateur coûteraient N² paquets.
+# Ils sont suspendus, et un seul instantané complet part à tout le monde
+# quand les arrivées retombent. Hors tempête, un client qui a manqué plus
+# d'événements qu'il n'y a d'utilisateurs en ligne reçoit aussi l'instantané.
+#
+# Le registre compte aussi, par salon (channels.py), les utilisateurs
+# distincts dont au moins une socket l'affiche : tous workers confondus.
+#
+# Avec Redis, chaque session appartient à un worker qui signale qu'il est en
+# vie (clé à TTL rafraîchie par PresenceTracker). Un worker qui plante ou est
+# redéployé ne retire pas ses sessions : les autres workers les purgent quand
+# sa clé expire, et annoncent le départ des utilisateurs concernés.
+
+import collections
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+EVENT_LOG_SIZE = 1000
+STORM_CHANGES = 50
+STORM_WINDOW = 1.0
+
+
+class MemoryPresenceStore:
+    """Registre local au processus."""
+
+    def __init__(self, log_size=EVENT_LOG_SIZE):
+        self._users = {}
+        self._sessions = collections.defaultdict(set)
+        self._channels = collections.defaultdict(collections.Counter)  # salon → {user_id: sockets}
+        self._log = collections.deque(maxlen=log_size)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def add_session(self, user_id, sid, info):
+        """Ajoute une session ; True si l'utilisateur n'était pas déjà en ligne."""
+        with self._lock:
+            joined = user_id not in self._users
+            self._users[user_id] = dict(info)
+            self._sessions[user_id].add(sid)
+            return joined
+
+    def remove_session(self, user_id, sid):
+        """Retire une session ; renvoie le nombre de sessions restantes."""
+        with self._lock:
+            sessions = self._sessions.get(user_id, set())
+            sessions.discard(sid)
+            if not sessions:
+                self._sessions.pop(user_id, None)
+            return len(sessions)
+
+    def expire(self, user_id):
+        """Retire l'utilisateur s'il n'a plus de session ; True s'il est parti."""
+        with self._lock:
+            if self._sessions.get(user_id):
+                return False
+            return self._users.pop(user_id, None) is not None
+
+    def remove_user(self, user_id):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+            return self._users.pop(user_id, None) is not None
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def count(self):
+        return len(self._users)
+
+    def users(self):
+        with self._lock:
+            return [dict(info, id=uid) for uid, info in self._users.items()]
+
+    def enter_channel(self, channel_id, user_id):
+        """Une socket de plus affiche le salon ; renvoie le nombre d'utilisateurs qui l'affichent."""
+        with self._lock:
+            self._channels[channel_id][user_id] += 1
+            return len(self._channels[channel_id])
+
+    def exit_channel(self, channel_id, user_id):
+        with self._lock:
+            sockets = self._channels.get(channel_id)
+            if sockets is None:
+                return 0
+            sockets[user_id] -= 1
+            if sockets[user_id] <= 0:
+                del sockets[user_id]
+            if not sockets:
+                del self._channels[channel_id]
+            return len(sockets)
+
+    def channel_count(self, channel_id):
+        return len(self._channels.get(channel_id, ()))
+
+    def heartbeat(self):
+        pass  # Un seul processus : ses sessions disparaissent avec lui
+
+    def prune_dead_workers(self):
+        return []
+
+    def claim_snapshot(self, ttl):
+        return True
+
+    def record(self, event):
+        with self._lock:
+            self._seq += 1
+            self._log.append(dict(event, seq=self._seq))
+            return self._seq
+
+    def seq(self):
+        return self._seq
+
+    def events_since(self, seq):
+        """Deltas postérieurs à `seq`, ou None s'ils ne sont plus dans le journal."""
+        with self._lock:
+            if seq > self._seq:
+                return None
+            if seq == self._seq:
+                return []
+            if not self._log or self._log[0]['seq'] > seq + 1:
+                return None
+            return [event for event in self._log if event['seq'] > seq]
+
+
+class RedisPresenceStore:
+    """Registre partagé : hash `<prefix>:users`, un set de `<worker>:<sid>` par
+    utilisateur, un hash par salon (`<prefix>:channel:<id>`, user_id → sockets)
+    et un journal des deltas borné (`<prefix>:log`).
+
+    Chaque worker tient aussi la liste de ses propres contributions
+    (`<prefix>:worker:<id>:sessions` et `:channels`) pour qu'un autre puisse
+    les retirer s'il meurt ; `<prefix>:workers` liste les workers connus.
+    """
+
+    # Les opérations composées passent par Lua pour rester atomiques entre workers
+    ADD_SESSION = """
+        local existed = redis.call('HEXISTS', KEYS[1], ARGV[1])
+        redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+        redis.call('SADD', KEYS[2], ARGV[2])
+        redis.call('SADD', KEYS[3], ARGV[4])
+        return 1 - existed
+    """
+    REMOVE_SESSION = """
+        redis.call('SREM', KEYS[3], ARGV[4])
+        redis.call('SREM', KEYS[2], ARGV[2])
+        return redis.call('SCARD', KEYS[2])
+    """
+    EXPIRE = """
+        if redis.call('SCARD', KEYS[2]) > 0 then
+            return 0
+        end
+        return redis.call('HDEL', KEYS[1], ARGV[1])
+    """
+    ENTER_CHANNEL = """
+        redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+        redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+        return redis.call('HLEN', KEYS[1])
+    """
+    EXIT_CHANNEL = """
+        if redis.call('HINCRBY', KEYS[2], ARGV[2], -1) <= 0 then
+            redis.call('HDEL', KEYS[2], ARGV[2])
+        end
+        if redis.call('HINCRBY', KEYS[1], ARGV[1], -1) <= 0 then
+            redis.call('HDEL', KEYS[1], ARGV[1])
+        end
+        return redis.call('HLEN', KEYS[1])
+    """
+    # Retire tout ce qu'un worker mort avait enregistré ; renvoie les
+    # utilisateurs qui n'ont plus aucune session. Idempotent : le premier
+    # worker qui le retire de `workers` fait le ménage, les autres rien.
+    PRUNE_WORKER = """
+        if redis.call('SREM', KEYS[1], ARGV[1]) == 0 then
+            return {}
+        end
+        local left = {}
+        for _, entry in ipairs(redis.call('SMEMBERS', KEYS[2])) do
+            local sep = string.find(entry, '|', 1, true)
+            local uid = string.sub(entry, 1, sep - 1)
+            local sids = ARGV[2] .. ':sids:' .. uid
+            redis.call('SREM', sids, ARGV[1] .. ':' .. string.sub(entry, sep + 1))
+            if redis.call('SCARD', sids) == 0 and redis.call('HDEL', KEYS[4], uid) == 1 then
+                table.insert(left, uid)
+            end
+        end
+        local channels = redis.call('HGETALL', KEYS[3])
+        for i = 1, #channels, 2 do
+            local sep = string.find(channels[i], '|', 1, true)
+            local key = ARGV[2] .. ':channel:' .. string.sub(channels[i], 1, sep - 1)
+            local uid = string.sub(channels[i], sep + 1)
+            if redis.call('HINCRBY', key, uid, -tonumber(channels[i + 1])) <= 0 then
+                redis.call('HDEL', key, uid)
+            end
+        end
+        redis.call('DEL', KEYS[2], KEYS[3])
+        return left
+    """
+    RECORD = """
+        local seq = redis.call('INCR', KEYS[1])
+        local event = cjson.decode(ARGV[1])
+        event['seq'] = seq
+        redis.call('RPUSH', KEYS[2], cjson.encode(event))
+        redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+        return seq
+    """
+
+    def __init__(self, url, prefix='chat:presence', log_size=EVENT_LOG_SIZE, worker_ttl=30):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("Le paquet 'redis' est requis pour PRESENCE_STORE_URL=redis://...") from e
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._key = f'{prefix}:users'
+        self._log_key = f'{prefix}:log'
+        self._seq_key = f'{prefix}:seq'
+        self._log_size = log_size
+        self._workers_key = f'{prefix}:workers'
+        self.worker_ttl = worker_ttl
+        self._worker = (None, None)
+        self._add_session = self._redis.register_script(self.ADD_SESSION)
+        self._remove_session = self._redis.register_script(self.REMOVE_SESSION)
+        self._expire = self._redis.register_script(self.EXPIRE)
+        self._record = self._redis.register_script(self.RECORD)
+        self._enter_channel = self._redis.register_script(self.ENTER_CHANNEL)
+        self._exit_channel = self._redis.register_script(self.EXIT_CHANNEL)
+        self._prune_worker = self._redis.register_script(self.PRUNE_WORKER)
+
+    @property
+    def worker_id(self):
+        # Recalculé après un fork (gunicorn --preload) : un id par processus
+        if self._worker[0] != os.getpid():
+            self._worker = (os.getpid(), f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}')
+        return self._worker[1]
+
+    def _worker_key(self, worker_id, suffix=''):
+        return f'{self._prefix}:worker:{worker_id}{suffix}'
+
+    def _sids_key(self, user_id):
+        return f'{self._prefix}:sids:{user_id}'
+
+    def _session_args(self, user_id, sid):
+        keys = [self._key, self._sids_key(user_id), self._worker_key(self.worker_id, ':sessions')]
+        return keys, [user_id, f'{self.worker_id}:{sid}', f'{user_id}|{sid}']
+
+    def add_session(self, user_id, sid, info):
+        keys, (uid, member, entry) = self._session_args(user_id, sid)
+        return bool(self._add_session(keys=keys, args=[uid, member, json.dumps(info), entry]))
+
+    def remove_session(self, user_id, sid):
+        keys, (uid, member, entry) = self._session_args(user_id, sid)
+        return int(self._remove_session(keys=keys, args=[uid, member, '', entry]))
+
+    def expire(self, user_id):
+        return bool(self._expire(keys=[self._key, self._sids_key(user_id)], args=[user_id]))
+
+    def remove_user(self, user_id):
+        pipe = self._redis.pipeline()
+        pipe.delete(self._sids_key(user_id))
+        pipe.hdel(self._key, user_id)
+        return bool(pipe.execute()[1])
+
+    def __contains__(self, user_id):
+        return bool(self._redis.hexists(self._key, user_id))
+
+    def count(self):
+        return self._redis.hlen(self._key)
+
+    def users(self):
+        return [
+            dict(json.loads(info), id=int(uid))
+            for uid, info in self._redis.hgetall(self._key).items()
+        ]
+
+    def _channel_key(self, channel_id):
+        return f'{self._prefix}:channel:{channel_id}'
+
+    def _channel_args(self, channel_id, user_id):
+        keys = [self._channel_key(channel_id), self._worker_key(self.worker_id, ':channels')]
+        return keys, [user_id, f'{channel_id}|{user_id}']
+
+    def enter_channel(self, channel_id, user_id):
+        keys, args = self._channel_args(channel_id, user_id)
+        return int(self._enter_channel(keys=keys, args=args))
+
+    def exit_channel(self, channel_id, user_id):
+        keys, args = self._channel_args(channel_id, user_id)
+        return int(self._exit_channel(keys=keys, args=args))
+
+    def channel_count(self, channel_id):
+        return self._redis.hlen(self._channel_key(channel_id))
+
+    def heartbeat(self):
+        """Ce worker est en vie pour `worker_ttl` secondes de plus."""
+        pipe = self._redis.pipeline()
+        pipe.set(self._worker_key(self.worker_id), 1, ex=self.worker_ttl)
+        pipe.sadd(self._workers_key, self.worker_id)
+        pipe.execute()
+
+    def claim_snapshot(self, ttl):
+        """Un seul instantané de fin de tempête par fenêtre de `ttl` s, tous workers confondus."""
+        return bool(self._redis.set(f'{self._prefix}:snapshot', self.worker_id, nx=True, px=int(ttl * 1000)))
+
+    def prune_dead_workers(self):
+        """Purge les sessions des workers dont la clé a expiré ; renvoie les utilisateurs partis."""
+        left = []
+        for raw in self._redis.smembers(self._workers_key):
+            worker_id = raw.decode() if isinstance(raw, bytes) else raw
+            if worker_id == self.worker_id or self._redis.exists(self._worker_key(worker_id)):
+                continue
+            keys = [self._workers_key, self._worker_key(worker_id, ':sessions'),
+                    self._worker_key(worker_id, ':channels'), self._key]
+            left.extend(int(uid) for uid in self._prune_worker(keys=keys, args=[worker_id, self._prefix]))
+        return left
+
+    def record(self, event):
+        return int(self._record(keys=[self._seq_key, self._log_key],
+                                args=[json.dumps(event), self._log_size]))
+
+    def seq(self):
+        return int(self._redis.get(self._seq_key) or 0)
+
+    def events_since(self, seq):
+        current = self.seq()
+        if seq > current:
+            return None
+        if seq == current:
+            return []
+        events = [json.loads(raw) for raw in self._redis.lrange(self._log_key, 0, -1)]
+        if not events or events[0]['seq'] > seq + 1:
+            return None
+        return [event for event in events if event['seq'] > seq]
+
+
+def create_presence_store(url=None, worker_ttl=30):
+    if not url or url.startswith('memory://'):
+        return MemoryPresenceStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisPresenceStore(url, worker_ttl=worker_ttl)
+    raise ValueError(f"PRESENCE_STORE_URL non supportée : {url}")
+
+
+class PresenceTracker:
+    """Traduit connexions / déconnexions en événements de présence.
+
+    `emit(event, data, to=None, skip_sid=None)` diffuse à tout le monde quand
+    `to` vaut None ; `spawn` et `sleep` viennent de Socket.IO (green threads).
+    """
+
+    def __init__(self, store, emit, spawn, sleep, grace=3.0, storm_changes=STORM_CHANGES,
+                 storm_window=STORM_WINDOW, clock=time.monotonic):
+        self.store = store
+        self.emit = emit
+        self.spawn = spawn
+        self.sleep = sleep
+        self.grace = grace
+        self.storm_changes = storm_changes
+        self.storm_window = storm_window
+        self.clock = clock
+        self._changes = collections.deque()  # instants des derniers join/leave de ce processus
+        self._storm = False
+        self._waiting = set()  # sockets arrivées pendant la tempête, sans instantané encore
+
+    def start(self, interval):
+        """Battement de cœur du worker et purge des workers morts (au démarrage puis toutes les `interval` s)."""
+        self.store.heartbeat()
+        self.spawn(self._maintain, interval)
+
+    def _maintain(self, interval):
+        while True:
+            try:
+                self.store.heartbeat()
+                for user_id in self.store.prune_dead_workers():
+                    self._announce_leave(user_id)
+            except Exception as e:
+                print(f"Erreur maintenance présence : {e}")
+            self.sleep(interval)
+
+    def snapshot(self):
+        seq = self.store.seq()
+        return {'seq': seq, 'users': self.store.users()}
+
+    def connect(self, user_id, sid, info, since=None):
+        if self.store.add_session(user_id, sid, info):
+            user = dict(info, id=user_id)
+            seq = self.store.record({'type': 'join', 'user': user})
+            if not self._changed():
+                self.emit('presence_join', {'seq': seq, 'user': user}, skip_sid=sid)
+        if self._storm:
+            self._waiting.add(sid)  # L'instantané de fin de tempête lui parviendra
+            return
+
+        # Reconnexion : seulement les deltas manqués si le journal les a encore
+        # et s'ils ne sont pas plus longs que la liste complète
+        events = self.store.events_since(since) if since is not None else None
+        if events is None or len(events) > self.store.count():
+            self.emit('presence_snapshot', self.snapshot(), to=sid)
+        else:
+            self.emit('presence_sync', {'seq': self.store.seq(), 'events': events}, to=sid)
+
+    def disconnect(self, user_id, sid):
+        self._waiting.discard(sid)
+        if self.store.remove_session(user_id, sid) == 0:
+            self.spawn(self._leave_after_grace, user_id)
+
+    def logout(self, user_id):
+        if self.store.remove_user(user_id):
+            self._announce_leave(user_id)
+
+    def _leave_after_grace(self, user_id):
+        self.sleep(self.grace)
+        if self.store.expire(user_id):
+            self._announce_leave(user_id)
+
+    def _announce_leave(self, user_id):
+        seq = self.store.record({'type': 'leave', 'id': user_id})
+        if not self._changed():
+            self.emit('presence_leave', {'seq': seq, 'id': user_id})
+
+    # ------------------------------------------------------------ tempêtes
+
+    def _changed(self):
+        """Note un join/leave ; True si on est (ou vient d'entrer) en tempête."""
+        now = self.clock()
+        self._changes.append(now)
+        while self._changes and self._changes[0] < now - self.storm_window:
+            self._changes.popleft()
+        if not self._storm and len(self._changes) > self.storm_changes:
+            self._storm = True
+            self.spawn(self._end_storm)
+        return self._storm
+
+    def _end_storm(self):
+        # Attend une fenêtre sans join/leave, puis un seul instantané pour tout le monde
+        while True:
+            self.sleep(self.storm_window)
+            if not self._changes or self._changes[-1] <= self.clock() - self.storm_window:
+                break
+        self._storm = False
+        self._changes.clear()
+        waiting, self._waiting = self._waiting, set()
+        snapshot = self.snapshot()
+        if self.store.claim_snapshot(self.storm_window):
+            self.emit('presence_snapshot', snapshot)
+        else:
+            # Un autre worker vient de l'envoyer à tous ; nos arrivées plus récentes l'ont peut-être manqué
+            for sid in waiting:
+                self.emit('presence_snapshot', snapshot, to=sid)
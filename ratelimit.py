@@ -0,0 +1,116 @@
+# ratelimit.py — LIMITES DE DÉBIT PAR SEAU À JETONS
+#
+# Chaque clé (« msg:user:42 », « msg:sid:abc… ») a un seau de `burst` jetons
+# qui se remplit à `rate` jetons par seconde ; une action consomme un jeton
+# ou est refusée. En mémoire pour un seul worker ; avec RATE_LIMIT_STORE_URL
+# en redis://…, l'état est partagé entre workers (script Lua atomique).
+
+import math
+import time
+
+MAX_MEMORY_KEYS = 50000
+
+
+class Limit:
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = float(rate)    # jetons par seconde
+        self.burst = float(burst)  # taille du seau
+
+    @classmethod
+    def parse(cls, name, spec):
+        """« 1/5 » → 1 jeton par seconde, seau de 5."""
+        rate, _, burst = spec.partition('/')
+        return cls(name, float(rate), float(burst or rate))
+
+
+class MemoryRateLimiter:
+
+    def __init__(self):
+        self._buckets = {}  # clé → (jetons, dernier remplissage)
+
+    def hit(self, key, limit):
+        """Consomme un jeton ; renvoie 0 si accepté, sinon les secondes avant le prochain."""
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - last) * limit.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > MAX_MEMORY_KEYS:
+                self._prune(now, limit)
+            return 0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / limit.rate
+
+    def _prune(self, now, limit):
+        # Un seau resté assez longtemps sans usage est plein : inutile de le garder
+        idle = limit.burst / limit.rate
+        self._buckets = {key: value for key, value in self._buckets.items() if now - value[1] < idle}
+
+
+class RedisRateLimiter:
+
+    HIT = """
+        local burst = tonumber(ARGV[2])
+        local rate = tonumber(ARGV[1])
+        local now = redis.call('TIME')
+        now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or burst
+        local ts = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + (now - ts) * rate)
+        local wait = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            wait = (1 - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], ARGV[3])
+        return tostring(wait)
+    """
+
+    def __init__(self, url, prefix='chat:ratelimit'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("Le paquet 'redis' est requis pour RATE_LIMIT_STORE_URL=redis://...") from e
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._hit = self._redis.register_script(self.HIT)
+
+    def hit(self, key, limit):
+        ttl_ms = math.ceil(limit.burst / limit.rate * 1000) + 1000
+        return float(self._hit(keys=[f'{self._prefix}:{key}'], args=[limit.rate, limit.burst, ttl_ms]))
+
+
+def create_rate_limiter(url=None):
+    if not url or url.startswith('memory://'):
+        return MemoryRateLimiter()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisRateLimiter(url)
+    raise ValueError(f"RATE_LIMIT_STORE_URL non supportée : {url}")
+
+
+class RateLimiter:
+    """Vérifie plusieurs limites d'un coup et compte les refus."""
+
+    def __init__(self, store, on_reject=None):
+        self.store = store
+        self.on_reject = on_reject  # on_reject(limit, scope)
+        self.rejected = {}
+
+    def check(self, limit, **scopes):
+        """scopes : user=42, sid='abc'… Renvoie 0 ou l'attente conseillée (s)."""
+        for scope, ident in scopes.items():
+            if ident is None:
+                continue
+            wait = self.store.hit(f'{limit.name}:{scope}:{ident}', limit)
+            if wait:
+                name = f'{limit.name}:{scope}'
+                self.rejected[name] = self.rejected.get(name, 0) + 1
+                if self.on_reject:
+                    self.on_reject(limit, scope)
+                return wait
+        return 0
@@ -0,0 +1,154 @@
+# recent.py — TAMPON CIRCULAIRE DES DERNIERS MESSAGES SÉRIALISÉS
+#
+# Rempli depuis la base au premier affichage du chat, puis alimenté par
+# handle_message : le chargement du chat et la resynchronisation après
+# reconnexion n'interrogent plus la base pour les messages récents.
+# Un tampon par salon (ChannelBuffers), créé au premier affichage du salon.
+
+import collections
+import threading
+
+
+class RecentMessages:
+
+    def __init__(self, maxlen=100):
+        self.maxlen = maxlen
+        self._items = collections.deque(maxlen=maxlen)  # (timestamp, message_dict)
+        self._lock = threading.Lock()
+        self._warmed = False
+        self._arrived = None  # Envois reçus pendant le remplissage (voir start_warming)
+        self._complete = False  # True si le tampon contient tout l'historique
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.maxlen > 0
+
+    @property
+    def warmed(self):
+        return self._warmed
+
+    def start_warming(self):
+        """Avant la lecture en base : les messages envoyés d'ici warm() sont gardés."""
+        with self._lock:
+            self._arrived = []
+
+    def warm(self, messages, complete):
+        """`messages` : liste de (timestamp, message_dict), fusionnée avec les envois arrivés entre-temps."""
+        with self._lock:
+            seen = {message['id'] for _, message in messages}
+            messages = messages + [item for item in self._arrived or () if item[1]['id'] not in seen]
+            messages.sort(key=lambda item: (item[0], item[1]['id']))
+            self._arrived = None
+            self._items.clear()
+            self._items.extend(messages[-self.maxlen:])
+            self._complete = complete and len(messages) <= self.maxlen
+            self._warmed = True
+
+    def append(self, timestamp, message):
+        with self._lock:
+            if not self._warmed:
+                if self._arrived is not None:
+                    self._arrived.append((timestamp, message))
+                return
+            if len(self._items) == self.maxlen:
+                self._complete = False
+            self._items.append((timestamp, message))
+
+    def remove(self, message_ids):
+        with self._lock:
+            self._items = collections.deque(
+                (item for item in self._items if item[1]['id'] not in message_ids),
+                maxlen=self.maxlen
+            )
+
+    def invalidate(self):
+        with self._lock:
+            self._items.clear()
+            self._warmed = False
+
+    def latest(self, limit):
+        """(timestamps, messages, has_older) des `limit` derniers, ou None si absent du cache."""
+        with self._lock:
+            if not self._warmed or (len(self._items) < limit and not self._complete):
+                self.misses += 1
+                return None
+            self.hits += 1
+            items = list(self._items)[-limit:]
+            has_older = len(self._items) > limit or not self._complete
+        return [ts for ts, _ in items], [msg for _, msg in items], has_older
+
+    def since(self, after_id):
+        """Messages d'id > after_id, ou None si le tampon ne remonte pas assez loin."""
+        with self._lock:
+            if not self._warmed or not self._items:
+                self.misses += 1
+                return None
+            oldest_id = self._items[0][1]['id']
+            if after_id < oldest_id - 1 and not self._complete:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return [msg for _, msg in self._items if msg['id'] > after_id]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._items),
+            'maxlen': self.maxlen,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else None,
+        }
+
+
+class ChannelBuffers:
+    """Un RecentMessages par salon ; les moins récemment affichés sont oubliés."""
+
+    def __init__(self, maxlen=100, max_channels=50):
+        self.maxlen = maxlen
+        self.max_channels = max_channels
+        self._buffers = collections.OrderedDict()  # channel_id → RecentMessages
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.maxlen > 0
+
+    def channel(self, channel_id):
+        with self._lock:
+            buffer = self._buffers.get(channel_id)
+            if buffer is None:
+                buffer = self._buffers[channel_id] = RecentMessages(self.maxlen)
+                while len(self._buffers) > self.max_channels:
+                    self._buffers.popitem(last=False)
+            self._buffers.move_to_end(channel_id)
+            return buffer
+
+    def append(self, channel_id, timestamp, message):
+        # Salon jamais affiché par ce processus : rien à tenir à jour
+        buffer = self._buffers.get(channel_id)
+        if buffer is not None:
+            buffer.append(timestamp, message)
+
+    def remove(self, message_ids):
+        for buffer in list(self._buffers.values()):
+            buffer.remove(message_ids)
+
+    def invalidate(self):
+        for buffer in list(self._buffers.values()):
+            buffer.invalidate()
+
+    def stats(self):
+        buffers = list(self._buffers.values())
+        hits = sum(buffer.hits for buffer in buffers)
+        misses = sum(buffer.misses for buffer in buffers)
+        return {
+            'channels': len(buffers),
+            'size': sum(len(buffer._items) for buffer in buffers),
+            'maxlen': self.maxlen,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        }
@@ -0,0 +1,292 @@
+# retention.py — RÉTENTION ET ARCHIVAGE DES MESSAGES ANCIENS
+#
+# La table `message` ne garde que les MESSAGE_RETENTION_DAYS derniers jours.
+# Au-delà, les messages sont déplacés par lots vers des fichiers JSONL
+# compressés, un par jour : <archive>/AAAA/MM/JJ.jsonl.gz. Chaque lot est
+# d'abord écrit (et synchronisé sur disque), puis supprimé de la base par
+# petits DELETE : aucune transaction longue. Après un arrêt entre les deux,
+# un message peut se trouver deux fois dans l'archive ; la lecture dédoublonne
+# par id.
+#
+# Les agrégats de /chatting/stats et les références aux fichiers ne bougent
+# pas : un message archivé existe toujours. Il ne sort plus dans la recherche
+# plein texte (l'index suit la table).
+#
+# Une suppression de l'administrateur (moderation.py) retire aussi ses
+# messages de l'archive : les fichiers du jour concernés sont réécrits, sous
+# le même verrou que l'archivage.
+
+import fcntl
+import gzip
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, text
+
+from history import decode_cursor, encode_cursor, page_before
+from models import db, Message
+
+COLUMNS = ['id', 'username', 'message', 'file_url', 'timestamp', 'is_private', 'recipient_id', 'user_id',
+           'channel_id']
+ADVISORY_LOCK_KEY = 4_815_162_342  # pg_try_advisory_lock : un seul archivage à la fois
+
+
+class MessageArchive:
+
+    def __init__(self, root, cache_days=8):
+        self.root = root
+        self._cache = OrderedDict()  # chemin → (mtime, taille, lignes)
+        self._cache_days = cache_days
+
+    def path_for(self, day):
+        return os.path.join(self.root, f'{day:%Y}', f'{day:%m}', f'{day:%d}.jsonl.gz')
+
+    # --------------------------------------------------------------- écriture
+
+    def append(self, rows):
+        """Ajoute des messages (dicts) à leurs fichiers du jour ; durable au retour."""
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row['timestamp'].date(), []).append(row)
+        for day, day_rows in by_day.items():
+            path = self.path_for(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Un membre gzip de plus à la fin du fichier : gzip.open lit la suite
+            with open(path, 'ab') as raw:
+                self._write(raw, day_rows)
+            self._cache.pop(path, None)
+
+    @staticmethod
+    def _write(raw, rows):
+        with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+            for row in rows:
+                line = dict(row, timestamp=row['timestamp'].isoformat())
+                gz.write((json.dumps(line, ensure_ascii=False) + '\n').encode())
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    def purge(self, predicate):
+        """Retire les messages qui vérifient `predicate` ; renvoie ceux retirés.
+
+        L'appelant tient le verrou d'archivage (voir purge_archive).
+        """
+        removed = []
+        for day in self.days():
+            path = self.path_for(day)
+            rows = self._read_day(day)
+            kept = [row for row in rows if not predicate(row)]
+            if len(kept) == len(rows):
+                continue
+            removed.extend(row for row in rows if predicate(row))
+            if kept:
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'wb') as raw:
+                        self._write(raw, reversed(kept))
+                    os.replace(tmp_path, path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            else:
+                os.remove(path)
+            self._cache.pop(path, None)
+        return removed
+
+    # --------------------------------------------------------------- lecture
+
+    def days(self):
+        """Jours archivés, du plus récent au plus ancien."""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for year in os.listdir(self.root):
+            for month in os.listdir(os.path.join(self.root, year)) if year.isdigit() else ():
+                for name in os.listdir(os.path.join(self.root, year, month)):
+                    if name.endswith('.jsonl.gz'):
+                        found.append(datetime.strptime(f'{year}-{month}-{name[:2]}', '%Y-%m-%d').date())
+        return sorted(found, reverse=True)
+
+    def _read_day(self, day):
+        path = self.path_for(day)
+        stat = os.stat(path)
+        cached = self._cache.get(path)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            self._cache.move_to_end(path)
+            return cached[2]
+        rows = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                rows[row['id']] = row  # Doublons éventuels après un arrêt : même id
+        rows = sorted(rows.values(), key=lambda r: (r['timestamp'], r['id']), reverse=True)
+        self._cache[path] = (stat.st_mtime, stat.st_size, rows)
+        while len(self._cache) > self._cache_days:
+            self._cache.popitem(last=False)
+        return rows
+
+    def max_id(self):
+        """Plus grand id archivé (0 si l'archive est vide)."""
+        # Ids attribués dans l'ordre des envois : le plus grand est dans le dernier jour
+        for day in self.days():
+            rows = self._read_day(day)
+            if rows:
+                return max(row['id'] for row in rows)
+        return 0
+
+    def before(self, key, limit, predicate):
+        """Jusqu'à `limit` messages archivés de clé (timestamp, id) < key, du plus récent au plus ancien."""
+        found = []
+        for day in self.days():
+            if key is not None and day > key[0].date():
+                continue
+            for row in self._read_day(day):
+                if key is not None and (row['timestamp'], row['id']) >= key:
+                    continue
+                if predicate(row):
+                    found.append(row)
+                    if len(found) > limit:  # Un de plus : y a-t-il une suite ?
+                        return found
+        return found
+
+
+def page_with_archive(query, archive, predicate, cursor=None, limit=50):
+    """page_before() qui continue dans l'archive une fois la table épuisée.
+
+    `predicate(row)` applique aux messages archivés (dicts) le filtre de `query`.
+    Renvoie (messages du plus ancien au plus récent, next_cursor).
+    """
+    rows, next_cursor = page_before(query, cursor=cursor, limit=limit)
+    if next_cursor is not None or archive is None:
+        return rows, next_cursor
+
+    key = (rows[0].timestamp, rows[0].id) if rows else (decode_cursor(cursor) if cursor else None)
+    archived = archive.before(key, limit - len(rows), predicate)
+    seen = {row.id for row in rows}
+    older = [Message(**row) for row in archived if row['id'] not in seen]
+    has_more = len(older) > limit - len(rows)
+    older = older[:limit - len(rows)]
+    older.reverse()
+    rows = older + rows
+    next_cursor = encode_cursor(rows[0].timestamp, rows[0].id) if has_more and rows else None
+    return rows, next_cursor
+
+
+def purge_archive(archive, predicate, sleep=time.sleep, attempts=30):
+    """MessageArchive.purge() sous le verrou d'archivage (attend jusqu'à `attempts` secondes)."""
+    if not archive.days():
+        return []
+    lock = _JobLock(os.path.join(archive.root, '.lock'))
+    for _ in range(attempts):
+        if lock.acquire():
+            break
+        sleep(1)
+    else:
+        raise RuntimeError("Archivage en cours : archive non purgée, relancer la suppression")
+    try:
+        return archive.purge(predicate)
+    finally:
+        lock.release()
+
+
+# ------------------------------------------------------------------ archivage
+
+class _JobLock:
+    """Un seul archivage à la fois : verrou consultatif PostgreSQL, sinon fichier."""
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._connection = None
+        self._file = None
+
+    def acquire(self):
+        if db.engine.dialect.name == 'postgresql':
+            self._connection = db.engine.connect()
+            if self._connection.scalar(text('SELECT pg_try_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY}):
+                return True
+            self._connection.close()
+            self._connection = None
+            return False
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        self._file = open(self.lock_path, 'w')
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+
+    def release(self):
+        if self._connection is not None:
+            self._connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
+            self._connection.close()
+            self._connection = None
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class RetentionJob:
+
+    def __init__(self, archive, days, batch_size=1000, pause=0.05, sleep=time.sleep):
+        self.archive = archive
+        self.days = days
+        self.batch_size = batch_size
+        self.pause = pause  # entre deux lots : laisse passer le trafic
+        self.sleep = sleep
+        self.stats = {'runs': 0, 'archived': 0, 'last_run': None, 'last_archived': 0, 'last_seconds': None}
+
+    def run(self, before=None):
+        """Archive les messages plus anciens que `before` (défaut : fenêtre de rétention)."""
+        if before is None:
+            if not self.days:
+                return 0
+            before = datetime.utcnow() - timedelta(days=self.days)
+        lock = _JobLock(os.path.join(self.archive.root, '.lock'))
+        if not lock.acquire():
+            print("Archivage déjà en cours ailleurs, ignoré.")
+            return 0
+        started = time.perf_counter()
+        archived = 0
+        try:
+            # Le message d'id maximal reste en base : SQLite (max(id) + 1) réattribuerait
+            # sinon des ids archivés, que la lecture dédoublonnée masquerait
+            highest = db.session.query(func.max(Message.id)).scalar()
+            while True:
+                batch = Message.query.filter(Message.timestamp < before, Message.id != highest).order_by(
+                    Message.timestamp, Message.id).limit(self.batch_size).all()
+                if not batch:
+                    break
+                rows = [{column: getattr(msg, column) for column in COLUMNS} for msg in batch]
+                db.session.rollback()  # Rien n'est tenu pendant l'écriture des fichiers
+                self.archive.append(rows)
+                db.session.execute(delete(Message).where(Message.id.in_([row['id'] for row in rows])))
+                db.session.commit()
+                archived += len(rows)
+                self.sleep(self.pause)
+        finally:
+            db.session.remove()
+            lock.release()
+        self.stats['runs'] += 1
+        self.stats['archived'] += archived
+        self.stats['last_run'] = datetime.utcnow().isoformat(timespec='seconds')
+        self.stats['last_archived'] = archived
+        self.stats['last_seconds'] = round(time.perf_counter() - started, 2)
+        return archived
+
+    def run_forever(self, app, interval):
+        while True:
+            self.sleep(interval)
+            try:
+                with app.app_context():
+                    archived = self.run()
+                if archived:
+                    print(f"🗄️ {archived} message(s) archivé(s).")
+            except Exception as e:
+                print(f"Erreur archivage : {e}")
@@ -0,0 +1,91 @@
+# rollups.py — COMPTEURS AGRÉGÉS (PAR JOUR / PAR UTILISATEUR) DES MESSAGES
+#
+# Mis à jour dans la même transaction que l'insertion ou la suppression
+# des messages, par UPSERT incrémental ; `flask rebuild-stats` les recalcule.
+
+import collections
+
+from sqlalchemy import Date, cast, delete, func, insert, select
+
+from models import db, Message, DailyMessageCount, UserMessageCount
+
+
+def _value(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def _upsert(model, key, deltas):
+    deltas = {k: d for k, d in deltas.items() if d}
+    if not deltas:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise RuntimeError(f"Base non supportée pour les agrégats : {dialect}")
+
+    stmt = dialect_insert(model).values([{key: k, 'count': d} for k, d in deltas.items()])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={'count': model.count + stmt.excluded.count}
+    )
+    db.session.execute(stmt)
+
+
+def _apply(rows, sign):
+    per_day = collections.Counter()
+    per_user = collections.Counter()
+    for row in rows:
+        timestamp = _value(row, 'timestamp')
+        if timestamp is not None:
+            per_day[timestamp.date()] += sign
+        user_id = _value(row, 'user_id')
+        if user_id is not None:
+            per_user[user_id] += sign
+    _upsert(DailyMessageCount, 'day', per_day)
+    _upsert(UserMessageCount, 'user_id', per_user)
+
+
+def record_messages(rows):
+    """À appeler avant le commit qui insère `rows` (dicts ou Message)."""
+    _apply(rows, +1)
+
+
+def forget_messages(rows):
+    """À appeler avant le commit qui supprime `rows`."""
+    _apply(rows, -1)
+
+
+def _day_expression():
+    # CAST(... AS DATE) renvoie l'année seule sous SQLite
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return func.date(Message.timestamp)
+    return cast(Message.timestamp, Date)
+
+
+def rebuild():
+    """Recalcule entièrement les agrégats depuis la table `message`."""
+    db.session.execute(delete(DailyMessageCount))
+    db.session.execute(delete(UserMessageCount))
+
+    day = _day_expression()
+    db.session.execute(insert(DailyMessageCount).from_select(
+        ['day', 'count'],
+        select(day, func.count(Message.id)).where(Message.timestamp.isnot(None)).group_by(day)
+    ))
+    db.session.execute(insert(UserMessageCount).from_select(
+        ['user_id', 'count'],
+        select(Message.user_id, func.count(Message.id))
+        .where(Message.user_id.isnot(None)).group_by(Message.user_id)
+    ))
+    db.session.commit()
+
+
+def ensure_backfilled():
+    """Premier démarrage après l'ajout des agrégats : on les remplit une fois."""
+    if db.session.query(DailyMessageCount.day).first() is None \
+            and db.session.query(Message.id).first() is not None:
+        rebuild()
+        print("✅ Agrégats des statistiques reconstruits.")
@@ -0,0 +1,122 @@
+# search.py — RECHERCHE PLEIN TEXTE DANS L'HISTORIQUE
+#
+# SQLite : table virtuelle FTS5 à contenu externe, synchronisée par triggers.
+# PostgreSQL : colonne tsvector générée + index GIN.
+# Dans les deux cas l'index suit les INSERT/DELETE de la base elle-même,
+# y compris les insertions par lots du writer.
+
+import re
+
+from sqlalchemy import text
+
+import channels
+from models import db, Message
+
+MAX_PAGE_SIZE = 50
+MAX_OFFSET = 1000  # Au-delà, affiner la recherche plutôt que paginer
+# Le classement porte sur les RANK_WINDOW correspondances les plus récentes :
+# un mot présent dans la moitié des messages ne force pas à tout scorer
+RANK_WINDOW = 2000
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5("
+    "message, content='message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN "
+    "INSERT INTO message_fts(rowid, message) VALUES (new.id, new.message); END",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN "
+    "INSERT INTO message_fts(message_fts, rowid, message) VALUES ('delete', old.id, old.message); END",
+    "CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF message ON message BEGIN "
+    "INSERT INTO message_fts(message_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+    "INSERT INTO message_fts(rowid, message) VALUES (new.id, new.message); END",
+]
+
+POSTGRES_DDL = [
+    "ALTER TABLE message ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(message, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_message_search_vector ON message USING GIN (search_vector)",
+]
+
+
+def install(connection):
+    """Crée l'index plein texte s'il manque (idempotent)."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        existed = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_fts'"
+        )).first() is not None
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if not existed:
+            # Indexe les messages déjà présents
+            connection.execute(text("INSERT INTO message_fts(message_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+def ensure_search_index():
+    with db.engine.begin() as connection:
+        install(connection)
+
+
+def _fts5_query(query_text):
+    # Chaque mot entre guillemets : pas d'opérateurs FTS5 venant de l'utilisateur.
+    # Pas de recherche par préfixe (`mot*`) : sans index de préfixes, elle
+    # fusionne les listes de tous les termes correspondants
+    words = re.findall(r'\w+', query_text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def search_messages(query_text, user_id, page=1, per_page=20):
+    """Messages visibles par `user_id`, classés par pertinence.
+
+    Renvoie (messages, has_more) ; messages est une liste de Message.
+    """
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    offset = (max(page, 1) - 1) * per_page
+    if offset > MAX_OFFSET:
+        return [], False
+
+    params = {'user_id': user_id, 'limit': per_page + 1, 'offset': offset, 'window': RANK_WINDOW,
+              'default_channel': channels.default_channel_id()}
+    # Privés de l'utilisateur, et messages publics des salons dont il est membre
+    visible = (
+        "(message.is_private = false OR message.user_id = :user_id OR message.recipient_id = :user_id)"
+        " AND (message.channel_id IS NULL OR message.channel_id = :default_channel"
+        " OR message.channel_id IN (SELECT channel_id FROM channel_member WHERE user_id = :user_id))"
+    )
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        params['query'] = _fts5_query(query_text)
+        if params['query'] is None:
+            return [], False
+        # Filtre de visibilité dans la fenêtre : sinon des correspondances
+        # invisibles récentes en évinceraient de visibles
+        sql = (
+            "SELECT hits.id FROM ("
+            "  SELECT message.id, bm25(message_fts) AS rank FROM message_fts"
+            "  JOIN message ON message.id = message_fts.rowid"
+            f"  WHERE message_fts MATCH :query AND {visible}"
+            "  ORDER BY message_fts.rowid DESC LIMIT :window"
+            ") AS hits ORDER BY hits.rank, hits.id DESC LIMIT :limit OFFSET :offset"
+        )
+    elif dialect == 'postgresql':
+        params['query'] = query_text
+        sql = (
+            "SELECT hits.id FROM ("
+            "  SELECT message.id, ts_rank(message.search_vector, query) AS rank"
+            "  FROM message, plainto_tsquery('simple', :query) AS query"
+            f"  WHERE message.search_vector @@ query AND {visible}"
+            "  ORDER BY message.id DESC LIMIT :window"
+            ") AS hits ORDER BY hits.rank DESC, hits.id DESC LIMIT :limit OFFSET :offset"
+        )
+    else:
+        raise RuntimeError(f"Recherche non supportée pour la base : {dialect}")
+
+    ids = db.session.execute(text(sql), params).scalars().all()
+    has_more = len(ids) > per_page
+    ids = ids[:per_page]
+    by_id = {msg.id: msg for msg in Message.query.filter(Message.id.in_(ids))} if ids else {}
+    return [by_id[i] for i in ids if i in by_id], has_more
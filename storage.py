@@ -0,0 +1,161 @@
+# storage.py — STOCKAGE DES FICHIERS ENVOYÉS, ADRESSÉ PAR CONTENU
+#
+# L'upload est lu par blocs : le SHA-256 est calculé et la taille vérifiée
+# pendant l'écriture dans un fichier temporaire. Un contenu déjà connu n'est
+# pas réécrit. Les fichiers sont rangés par préfixe du hash
+# (ab/cd/abcd….png) et comptés par référence (Message.file_url, User.avatar).
+# Un message ne peut joindre qu'un fichier que son auteur a envoyé (FileUpload) :
+# sinon n'importe qui épinglerait n'importe quel hash contre le ramasse-miettes.
+
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, FileUpload, StoredFile
+
+CHUNK_SIZE = 64 * 1024
+SHA256_NAME = re.compile(r'/([0-9a-f]{64})\.[a-z0-9]+$')
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class FileStore:
+
+    def __init__(self, root, url_prefix):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+        self.tmp_dir = os.path.join(root, '.tmp')
+
+    def _relative_path(self, sha256, ext):
+        return f'{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}'
+
+    def path_for(self, url):
+        """Chemin disque d'une URL du magasin, ou None si elle n'en vient pas."""
+        if not url or not url.startswith(self.url_prefix + '/'):
+            return None
+        return os.path.join(self.root, url[len(self.url_prefix) + 1:])
+
+    def _sha256_of(self, url):
+        if not url or not url.startswith(self.url_prefix + '/'):
+            return None
+        match = SHA256_NAME.search(url)
+        return match.group(1) if match else None
+
+    # --------------------------------------------------------------- écriture
+
+    def save(self, stream, ext, max_size):
+        """Copie `stream` dans le magasin et renvoie son URL.
+
+        Lève UploadTooLarge dès que `max_size` octets sont dépassés.
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise UploadTooLarge()
+                    digest.update(chunk)
+                    tmp.write(chunk)
+
+            sha256 = digest.hexdigest()
+            existing = db.session.get(StoredFile, sha256)
+            if existing is not None and os.path.exists(self.path_for(existing.url)):
+                # Déjà stocké : rien à écrire ; on repousse le ramasse-miettes
+                existing.created_at = datetime.utcnow()
+                db.session.commit()
+                return existing.url
+
+            relative = self._relative_path(sha256, ext)
+            final_path = os.path.join(self.root, relative)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+            url = f'{self.url_prefix}/{relative}'
+            if existing is None:
+                self._register(sha256, url, size)
+            else:
+                existing.url = url
+                db.session.commit()
+            return url
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _register(self, sha256, url, size):
+        db.session.add(StoredFile(sha256=sha256, url=url, size=size, refcount=0))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Même contenu envoyé en parallèle : déjà enregistré
+
+    def record_upload(self, url, user_id):
+        """Note que `user_id` a envoyé le fichier de `url` (voir uploaded_by)."""
+        sha256 = self._sha256_of(url)
+        if sha256 is None or db.session.get(FileUpload, (sha256, user_id)) is not None:
+            return
+        db.session.add(FileUpload(sha256=sha256, user_id=user_id))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Même fichier envoyé deux fois en parallèle
+
+    def uploaded_by(self, url, user_id):
+        """True si `url` est un fichier du magasin, présent sur disque, envoyé par `user_id`."""
+        if not isinstance(url, str) or self._sha256_of(url) is None:
+            return False
+        known = db.session.execute(
+            db.select(FileUpload.user_id)
+            .join(StoredFile, StoredFile.sha256 == FileUpload.sha256)
+            .where(StoredFile.url == url, FileUpload.user_id == user_id)
+        ).first()
+        return known is not None and os.path.isfile(self.path_for(url))
+
+    # --------------------------------------------------------------- références
+
+    def _shift(self, urls, amount):
+        counts = {}
+        for url in urls:
+            sha256 = self._sha256_of(url)
+            if sha256:
+                counts[sha256] = counts.get(sha256, 0) + amount
+        for sha256, delta in counts.items():
+            db.session.execute(
+                db.update(StoredFile)
+                .where(StoredFile.sha256 == sha256)
+                .values(refcount=StoredFile.refcount + delta)
+            )
+
+    def add_refs(self, urls):
+        """À appeler dans la transaction qui enregistre les références."""
+        self._shift(urls, +1)
+
+    def release(self, urls):
+        """À appeler dans la transaction qui supprime / remplace les références."""
+        self._shift(urls, -1)
+
+    def collect_garbage(self, grace=timedelta(hours=1)):
+        """Supprime les fichiers sans référence plus vieux que `grace`."""
+        cutoff = datetime.utcnow() - grace
+        orphans = StoredFile.query.filter(
+            StoredFile.refcount <= 0, StoredFile.created_at < cutoff
+        ).limit(1000).all()
+        for stored in orphans:
+            path = self.path_for(stored.url)
+            if path and os.path.exists(path):
+                os.remove(path)
+            db.session.execute(db.delete(FileUpload).where(FileUpload.sha256 == stored.sha256))
+            db.session.delete(stored)
+        db.session.commit()
+        return len(orphans)
@@ -0,0 +1,64 @@
+# tests/test_serialize_queries.py — SÉRIALISATION D'UNE PAGE DE MESSAGES
+#
+# serialize_messages() charge auteurs et destinataires en une requête IN :
+# le nombre de requêtes ne dépend pas du nombre de messages.
+#
+#   python -m pytest -q tests
+
+import os
+import sys
+import warnings
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.simplefilter('ignore')
+
+from sqlalchemy import event  # noqa: E402
+
+import extensions as ext  # noqa: E402
+from factory import create_app  # noqa: E402
+from models import db, Message, User, serialize_messages  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'chat.db'),
+                      'REPLICA_DATABASE_URL': None, 'PASSWORD_WORKERS': 0,
+                      'TEMPLATE_CACHE_DIR': str(tmp_path / 'jinja_cache')})
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f'user{i}', number=f'060000000{i}', password_hash='x') for i in range(5)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all(
+            Message(username=users[i % 5].username, message=f'message {i}', user_id=users[i % 5].id,
+                    is_private=i % 3 == 0, recipient_id=users[(i + 1) % 5].id if i % 3 == 0 else None)
+            for i in range(50))
+        db.session.commit()
+        yield app
+        db.session.remove()
+    ext.message_writer.shutdown()
+
+
+def count_queries(messages):
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        serialize_messages(messages)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(statements)
+
+
+def test_query_count_does_not_grow_with_messages(app):
+    with app.app_context():
+        db.session.remove()  # Session neuve : aucun utilisateur déjà chargé
+        one = Message.query.order_by(Message.id).limit(1).all()
+        fifty = Message.query.order_by(Message.id).limit(50).all()
+        assert len(fifty) == 50
+        assert count_queries(one) == count_queries(fifty) == 1
@@ -0,0 +1,69 @@
+# usercache.py — CACHE DES UTILISATEURS POUR user_loader ET LES SOCKETS
+#
+# current_user est rechargé à chaque requête HTTP et à chaque événement
+# Socket.IO. Ici les colonnes d'un User sont gardées en mémoire (LRU borné +
+# TTL) et rattachées à la session sans requête : merge(load=False).
+# Le TTL borne le retard sur les modifications faites par un autre worker ;
+# dans ce processus, invalidate() est appelé à chaque modification.
+
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User
+
+# Le hash du mot de passe n'est pas gardé : chargé à la demande s'il est lu
+CACHED_COLUMNS = [column.key for column in User.__table__.columns if column.key != 'password_hash']
+
+
+class UserCache:
+
+    def __init__(self, maxsize=1000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # id → (colonnes, expiration)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        """User attaché à la session courante, ou None s'il n'existe pas."""
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            user = User(**entry[0])
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+        self.misses += 1
+        user = db.session.get(User, user_id)
+        if user is None:
+            self._entries.pop(user_id, None)
+            return None
+        self._entries[user_id] = ({key: getattr(user, key) for key in CACHED_COLUMNS},
+                                  time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return user
+
+    def invalidate(self, user_id=None):
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else None,
+        }
@@ -0,0 +1,589 @@
+# views.py — ROUTES HTTP
+#
+# Déclarées sans application ; factory.create_app() les enregistre avec
+# init_app(). Les noms d'endpoint restent ceux des fonctions (url_for('chat')…).
+
+import math
+import os
+import re
+from functools import wraps
+
+from flask import Response, current_app, render_template, request, redirect, url_for, flash, jsonify, send_file, abort
+from flask_login import login_user, logout_user, login_required, current_user
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import channels
+import extensions as ext
+import images
+import metrics
+import passwords
+import search
+from database import primary, read_replica
+from history import MAX_PAGE_SIZE, encode_cursor, page_before
+from models import db, User, Message, ModerationJob, DailyMessageCount, UserMessageCount, serialize_messages
+from retention import page_with_archive
+from storage import UploadTooLarge
+from workers import PoolFull
+
+_routes = []
+_error_handlers = []
+
+
+def route(rule, **options):
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
+
+
+def errorhandler(code):
+    def decorator(handler):
+        _error_handlers.append((code, handler))
+        return handler
+    return decorator
+
+
+def init_app(app):
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    for code, handler in _error_handlers:
+        app.register_error_handler(code, handler)
+
+
+def public_messages(channel_id):
+    # Fil d'un salon (les messages privés n'en ont pas), servi par ix_message_channel_timestamp
+    return Message.query.filter_by(channel_id=channel_id)
+
+def in_channel(channel_id):
+    # Même filtre que public_messages(), pour les messages archivés ;
+    # ceux archivés avant les salons sont dans le salon par défaut
+    default = channels.default_channel_id()
+    def predicate(row):
+        if 'channel_id' not in row:
+            return not row['is_private'] and channel_id == default
+        return row['channel_id'] == channel_id
+    return predicate
+
+def public_page(channel_id, cursor=None, limit=50):
+    return page_with_archive(public_messages(channel_id), ext.message_archive, in_channel(channel_id),
+                             cursor=cursor, limit=limit)
+
+def warm_recent_messages(channel_id):
+    # Au premier affichage du salon (url_for() est utilisé par la sérialisation).
+    # Le tampon se dit complet : lu au primaire (la réplique peut être en retard),
+    # avec les messages encore dans la file du writer et ceux envoyés pendant la lecture
+    buffer = ext.recent_messages.channel(channel_id)
+    buffer.start_warming()
+    pending = [Message(**row) for row in ext.message_writer.pending(lambda row: row['channel_id'] == channel_id)]
+    with primary():
+        rows, next_cursor = public_page(channel_id, limit=buffer.maxlen)
+        written = {row.id for row in rows}
+        rows += [message for message in pending if message.id not in written]
+        serialized = serialize_messages(rows)
+    buffer.warm([(row.timestamp, msg) for row, msg in zip(rows, serialized)], complete=next_cursor is None)
+
+def requested_channel():
+    """Salon demandé (?channel=<id>) s'il existe et que l'utilisateur en est membre, sinon None."""
+    # Au primaire : un salon créé ou rejoint à l'instant est peut-être encore absent de la réplique
+    with primary():
+        channel_id = request.args.get('channel', type=int) or channels.default_channel_id()
+        channel = channels.get_channel(channel_id)
+        if channel is None or not channels.is_member(channel.id, current_user.id):
+            return None
+        return channel
+
+def prepare_variants(url):
+    try:
+        ext.image_pipeline.schedule(url)
+    except PoolFull:
+        pass  # Générées à la première demande sur /media
+
+@route('/')
+def home():
+    if current_user.is_authenticated:
+        return redirect(url_for('chat'))
+    return render_template('home.html')
+
+@route('/students/chat')
+@login_required
+@read_replica
+def chat():
+    try:
+        channel = requested_channel()
+        if channel is None:
+            flash('🚫 Salon introuvable ou non rejoint.', 'warning')
+            return redirect(url_for('chat'))
+        buffer = ext.recent_messages.channel(channel.id) if ext.recent_messages.enabled else None
+        if buffer is not None and not buffer.warmed:
+            warm_recent_messages(channel.id)
+        cached = buffer.latest(50) if buffer is not None else None
+        if cached is not None:
+            timestamps, messages, has_older = cached
+            next_cursor = encode_cursor(timestamps[0], messages[0]['id']) if has_older and messages else None
+        else:
+            rows, next_cursor = public_page(channel.id, limit=50)
+            messages = serialize_messages(rows)
+        # Page assemblée à partir des fragments déjà rendus (voir fragments.py)
+        return render_template('index.html', messages=messages, user=current_user,
+                               messages_html=ext.fragments.render_all(messages),
+                               next_cursor=next_cursor, channel=channel.to_dict(),
+                               channels=channels.channels_for(current_user.id))
+    except Exception as e:
+        db.session.rollback()
+        flash('❌ Erreur serveur. Réessayez.', 'danger')
+        flash('❌ Erreur lors du chargement des messages.', 'danger')
+        print(f"Erreur chat : {e}")
+        return render_template('home.html')
+
+
+@route('/api/messages/history')
+@login_required
+@read_replica
+def message_history():
+    channel = requested_channel()
+    if channel is None:
+        return jsonify({'success': False, 'error': 'Salon introuvable ou non rejoint'}), 403
+    try:
+        messages, next_cursor = public_page(
+            channel.id,
+            cursor=request.args.get('before'),
+            limit=min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'messages': serialize_messages(messages),
+        'next_cursor': next_cursor
+    })
+
+
+@route('/api/conversations/<int:user_id>')
+@login_required
+@read_replica
+def conversation_history(user_id):
+    # Les deux sens de la conversation, servis par ix_message_conversation
+    me = current_user.id
+    query = Message.query.filter(db.or_(
+        db.and_(Message.recipient_id == user_id, Message.user_id == me),
+        db.and_(Message.recipient_id == me, Message.user_id == user_id)
+    ))
+    def in_conversation(row):
+        return (row['recipient_id'], row['user_id']) in ((user_id, me), (me, user_id))
+
+    try:
+        messages, next_cursor = page_with_archive(
+            query, ext.message_archive, in_conversation,
+            cursor=request.args.get('before'),
+            limit=min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'messages': serialize_messages(messages),
+        'next_cursor': next_cursor
+    })
+
+
+@route('/api/messages/search')
+@login_required
+@read_replica
+def message_search():
+    query_text = request.args.get('q', '').strip()
+    if not query_text:
+        return jsonify({'success': False, 'error': 'Recherche vide'}), 400
+    page = request.args.get('page', 1, type=int)
+    messages, has_more = search.search_messages(
+        query_text,
+        user_id=current_user.id,
+        page=page,
+        per_page=request.args.get('limit', 20, type=int)
+    )
+    return jsonify({
+        'success': True,
+        'messages': serialize_messages(messages),
+        'page': page,
+        'has_more': has_more
+    })
+
+
+@route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username'].strip()
+        password = request.form['password']
+        try:
+            user = User.query.filter_by(username=username).first()
+            password_hash = user.password_hash if user else None
+            # Le hachage cède la main : on ne garde pas une connexion du pool pendant ce temps
+            db.session.commit()
+            if user and passwords.verify_password(password_hash, password):
+                login_user(user)
+                flash('✅ Connexion réussie !', 'success')
+                return redirect(url_for('chat'))  # ← Redirige VERS LE CHAT
+            else:
+                flash('❌ Nom d’utilisateur ou mot de passe incorrect.', 'danger')
+                return render_template('login.html')  # ← Rester sur login si échec
+        except PoolFull:
+            flash('⏳ Serveur occupé, réessayez dans un instant.', 'warning')
+            return render_template('login.html'), 503
+        except Exception as e:
+            db.session.rollback()
+            flash('❌ Erreur serveur. Réessayez.', 'danger')
+            print(f"Erreur login : {e}")
+            return render_template('login.html')  # ← Rester sur login en cas d’erreur
+    return render_template('login.html')  # ← Page de login pour GET
+
+@route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form['username'].strip()
+        number = request.form['number'].strip()
+        password = request.form['password']
+        confirm_password = request.form['confirm_password']
+
+        if password != confirm_password:
+            flash('❌ Les mots de passe ne correspondent pas.', 'danger')
+            
+            if len(password) < 6:
+                flash('❌ Le mot de passe doit contenir au moins 6 caractères.', 'danger')
+                return render_template('register.html')
+            return render_template('register.html')
+        
+        number = number.replace(" ", "").replace("-", "") # Supprimer espaces et tirets
+        regex = r'^\+?\d{10,15}$' or r'^\d{10,15}$'  # Regex pour valider le numéro de téléphone
+
+        if not re.match(regex, number):
+            flash('❌ Le numéro de téléphone est invalide.', 'danger')
+            return render_template('register.html')
+
+        if number == "":
+            flash('❌ Le numéro ne peut pas être vide.', 'danger')
+            if len(number) < 10 or len(number) > 13:
+                flash('❌ Le numéro doit contenir entre 10 et 13 caractères.', 'danger')
+                return render_template('register.html')
+
+            return render_template('register.html')
+
+        try:
+            # Hachage avant toute requête : aucune connexion tenue pendant l'attente du pool
+            new_user = User(username=username, number=number)
+            new_user.set_password(password)
+
+            if User.query.filter_by(username=username, number=number).first():
+                flash('❌ Ce nom d’utilisateur est déjà pris ou numéro occupé.', 'danger')
+                return render_template('register.html')
+
+            db.session.add(new_user)
+            db.session.commit()
+            ext.counters.incr('users')
+
+            flash('✅ Compte créé ! Connectez-vous.', 'success')
+            return redirect(url_for('login'))
+        except PoolFull:
+            db.session.rollback()
+            flash('⏳ Serveur occupé, réessayez dans un instant.', 'warning')
+            return render_template('register.html'), 503
+        except Exception as e:
+            db.session.rollback()
+            flash('❌ Erreur serveur. Réessayez.', 'danger')
+            print(f"Erreur register : {e}")
+
+    return render_template('register.html')
+
+@route('/students/profile', methods=['GET', 'POST'])
+@login_required
+def profile():
+    if request.method == 'POST':
+        # Gestion de l'upload d'avatar
+        if 'avatar' not in request.files:
+            flash('❌ Aucun fichier sélectionné', 'danger')
+            return redirect(request.url)
+
+        file = request.files['avatar']
+        if file.filename == '':
+            flash('❌ Aucun fichier sélectionné', 'danger')
+            return redirect(request.url)
+
+        if file and '.' in file.filename and file.filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}:
+            try:
+                avatar_url = ext.file_store.save(file.stream, file.filename.rsplit('.', 1)[1].lower(),
+                                                 max_size=current_app.config['MAX_CONTENT_LENGTH'])
+            except UploadTooLarge:
+                flash('❌ Fichier trop volumineux (>10 Mo)', 'danger')
+                return redirect(request.url)
+
+            if avatar_url != current_user.avatar:
+                ext.file_store.release([current_user.avatar])
+                ext.file_store.add_refs([avatar_url])
+                current_user.avatar = avatar_url
+            db.session.commit()
+            ext.user_cache.invalidate(current_user.id)
+            # Les messages déjà sérialisés portent l'ancien avatar
+            ext.fragments.invalidate_user(current_user.id)
+            ext.recent_messages.invalidate()
+            prepare_variants(avatar_url)
+            flash('✅ Avatar mis à jour !', 'success')
+            return redirect(url_for('profile'))
+
+    # Pour la méthode GET → afficher le formulaire
+    return render_template('profile.html', user=current_user)
+
+@route('/logout')
+@login_required
+def logout():
+    ext.presence.logout(current_user.id)
+    logout_user()
+    flash('👋 Déconnecté.', 'info')
+    return redirect(url_for('home'))
+
+
+def admin_required(view):
+    """Routes JSON réservées à l'administrateur (ID=1)."""
+    @wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if current_user.id != 1:
+            return jsonify({'success': False, 'error': 'Accès refusé'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@route('/admin')
+@login_required
+@read_replica
+def admin():
+    if current_user.id != 1:  # Seul l'admin (ID=1) peut accéder
+        flash('🚫 Accès refusé. Réservé à l’administrateur.', 'danger')
+        return redirect(url_for('chat'))
+
+    # Les tableaux sont chargés page par page par /admin/api/users et /admin/api/messages
+    return render_template(
+        'admin.html',
+        total_users=ext.counters.get('users'),
+        total_messages=ext.counters.get('messages'),
+        total_private_messages=ext.counters.get('private_messages')
+    )
+
+
+@route('/admin/api/users')
+@admin_required
+@read_replica
+def admin_users_api():
+    limit = min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE)
+    after = request.args.get('after', 0, type=int)
+    query = request.args.get('q', '').strip()
+
+    matching = User.query.filter(User.id > after)
+    if query:
+        matching = matching.filter(User.username.startswith(query, autoescape=True))
+    users = matching.order_by(User.id).limit(limit + 1).all()
+    has_more = len(users) > limit
+    users = users[:limit]
+    return jsonify({
+        'success': True,
+        'users': [user.to_dict() for user in users],
+        'next_after': users[-1].id if has_more else None
+    })
+
+
+@route('/admin/api/messages')
+@admin_required
+@read_replica
+def admin_messages_api():
+    query = Message.query
+    if request.args.get('private') == '1':
+        query = query.filter_by(is_private=True)
+    user_id = request.args.get('user_id', type=int)
+    if user_id:
+        query = query.filter_by(user_id=user_id)
+    try:
+        messages, next_cursor = page_before(
+            query,
+            cursor=request.args.get('before'),
+            limit=min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    messages.reverse()  # Plus récents d'abord dans le tableau de bord
+    return jsonify({
+        'success': True,
+        'messages': serialize_messages(messages),
+        'next_cursor': next_cursor
+    })
+
+# 🧹 Suppressions : une tâche en arrière-plan par demande (voir moderation.py), suivie par sondage
+
+def submit_moderation(kind, ids):
+    if not isinstance(ids, list) or len(ids) > current_app.config['MODERATION_MAX_TARGETS']:
+        return jsonify({'success': False, 'error': 'Sélection invalide ou trop grande'}), 400
+    try:
+        job = ext.moderator.submit(kind, ids, requested_by=current_user.id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+
+@route('/admin/delete_user/<int:user_id>', methods=['POST'])
+@admin_required
+def delete_user(user_id):
+    return submit_moderation('users', [user_id])
+
+
+@route('/admin/delete_message/<int:message_id>', methods=['POST'])
+@admin_required
+def delete_message(message_id):
+    return submit_moderation('messages', [message_id])
+
+
+@route('/admin/api/moderation', methods=['POST'])
+@admin_required
+def moderation_submit():
+    data = request.get_json(silent=True) or {}
+    return submit_moderation(data.get('kind'), data.get('ids'))
+
+
+@route('/admin/api/moderation')
+@admin_required
+def moderation_jobs():
+    jobs = ModerationJob.query.order_by(ModerationJob.id.desc()).limit(20).all()
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs]})
+
+
+@route('/admin/api/moderation/<int:job_id>')
+@admin_required
+def moderation_job(job_id):
+    job = db.session.get(ModerationJob, job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Tâche introuvable'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@route('/chatting/stats')
+@login_required
+@read_replica
+def stats():
+    try:
+        # ✅ Lecture des seuls agrégats : coût constant quelle que soit la taille de `message`
+        week_stats = [
+            (row.day, row.count)
+            for row in DailyMessageCount.query.order_by(DailyMessageCount.day.desc()).limit(7)
+        ][::-1]
+
+        top_user = db.session.query(
+            User.username,
+            UserMessageCount.count.label('msg_count')
+        ).join(
+            User, User.id == UserMessageCount.user_id
+        ).order_by(
+            UserMessageCount.count.desc()
+        ).first()
+
+        total_messages = ext.counters.get('messages')
+        total_users = ext.counters.get('users')
+
+        return render_template('stats.html',
+            week_stats=week_stats,
+            top_user=top_user,
+            total_messages=total_messages,
+            total_users=total_users)
+    except Exception as e:
+        db.session.rollback()
+        flash('❌ Erreur lors du chargement des stats.', 'danger')
+        print(f"Erreur stats : {e}")
+        return redirect(url_for('chat'))
+
+
+@route('/upload_file', methods=['POST'])
+@login_required
+def upload_file():
+    wait = ext.rate_limiter.check(ext.limits['upload'], user=current_user.id)
+    if wait:
+        return jsonify({'success': False, 'error': 'Trop d’envois, patientez.'}), 429, \
+            {'Retry-After': str(math.ceil(wait))}
+    try:
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'error': 'Aucun fichier'}), 400
+
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'success': False, 'error': 'Fichier vide'}), 400
+
+        # Sécurité : types autorisés
+        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx', 'txt'}
+        extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+        if extension not in allowed_extensions:
+            return jsonify({'success': False, 'error': 'Type de fichier non autorisé'}), 400
+
+        # Sauvegarde par blocs, taille max (10 Mo) vérifiée au fil de l'écriture
+        try:
+            file_url = ext.file_store.save(file.stream, extension, max_size=10 * 1024 * 1024)
+        except UploadTooLarge:
+            return jsonify({'success': False, 'error': 'Fichier trop volumineux (>10 Mo)'}), 400
+        ext.file_store.record_upload(file_url, current_user.id)
+
+        prepare_variants(file_url)
+        return jsonify({'success': True, 'file_url': file_url})
+
+    except RequestEntityTooLarge:
+        return jsonify({'success': False, 'error': 'Fichier trop volumineux (>10 Mo)'}), 413
+    except Exception as e:
+        print(f"Erreur upload : {e}")
+        return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
+
+@route('/media/<variant>/<path:filename>')
+def media(variant, filename):
+    # Variante absente : générée ici une fois, puis servie depuis le disque
+    if variant not in images.VARIANTS:
+        abort(404)
+    try:
+        path = ext.image_pipeline.ensure(filename, variant)
+    except PoolFull:
+        path = None
+    except Exception as e:
+        print(f"Erreur redimensionnement {filename} : {e}")
+        path = None
+    if path is None:
+        if ext.image_pipeline.source_path(filename) is None:
+            abort(404)
+        return redirect(url_for('static', filename=filename))
+    # Les fichiers du magasin ne changent jamais pour une même URL
+    immutable = filename.startswith(current_app.config['FILE_STORE_ROOT'][len('static/'):] + '/')
+    return send_file(os.path.abspath(path), mimetype='image/webp', conditional=True,
+                     max_age=31536000 if immutable else 3600)
+
+@route('/metrics')
+def metrics_endpoint():
+    token = current_app.config['METRICS_TOKEN']
+    authorized = (current_user.is_authenticated and current_user.id == 1) or \
+        (token and request.headers.get('Authorization') == f'Bearer {token}')
+    if not authorized:
+        return jsonify({'success': False, 'error': 'Accès refusé'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@route('/admin/cache_stats')
+@admin_required
+def cache_stats():
+    return jsonify({
+        'success': True,
+        'recent_messages': ext.recent_messages.stats(),
+        'channel_sockets': ext.channel_sockets.stats(),
+        'fragments': ext.fragments.stats(),
+        'counters': ext.counters.stats(),
+        'user_cache': ext.user_cache.stats(),
+        'rate_limited': ext.rate_limiter.rejected,
+        'slow_consumers': ext.slow_consumers.stats,
+        'retention': ext.retention_job.stats,
+        'message_writer': ext.message_writer.stats,
+        'image_pool': ext.image_pool.stats(),
+        'password_pool': ext.password_pool.stats() if ext.password_pool else None
+    })
+
+# Gestionnaires d'erreurs
+@errorhandler(404)
+def not_found(e):
+    return render_template('404.html'), 404
+
+@errorhandler(500)
+def server_error(e):
+    return render_template('500.html'), 500
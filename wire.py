@@ -0,0 +1,28 @@
+# wire.py — FORMATS DE DIFFUSION DES MESSAGES PUBLICS
+#
+# python-socketio encode déjà un paquet une seule fois par emit() vers un
+# salon, puis réutilise les mêmes octets pour chaque socket. Ce qui reste
+# coûteux, c'est la taille : chaque message répète l'URL de l'avatar et le
+# pseudo de l'auteur. Un client peut donc choisir à la connexion
+# (auth.wire = 'compact') une forme courte : un tableau sans clés, l'auteur
+# réduit à son id, résolu côté client depuis la liste de présence.
+#
+#   'json'    : événement `receive_message`, dict complet (par défaut)
+#   'compact' : événement `m`, [id, user_id, message, timestamp, file_url, file_preview]
+#
+# Chaque salon de discussion a un salon Socket.IO par format (channels.channel_room) ;
+# une diffusion = un emit (donc un encodage) par format.
+
+WIRE_FORMATS = ('json', 'compact')
+COMPACT_EVENT = 'm'
+
+
+def wire_format(auth):
+    requested = (auth or {}).get('wire') if isinstance(auth, dict) else None
+    return requested if requested in WIRE_FORMATS else 'json'
+
+
+def compact_message(data):
+    """Forme courte d'un message sérialisé par Message.to_dict()."""
+    return [data['id'], data['user_id'], data['message'], data['timestamp'],
+            data['file_url'], data['file_preview']]
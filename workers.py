@@ -0,0 +1,68 @@
+# workers.py — POOL DE THREADS SYSTÈME POUR LE TRAVAIL CPU
+#
+# Sous eventlet, un calcul long dans une green thread bloque le hub entier
+# (plus aucun message n'est délivré). Ce pool l'exécute dans de vrais threads
+# via eventlet.tpool : seule la green thread appelante attend. Le nombre de
+# tâches en cours et en attente est borné.
+
+from eventlet import semaphore, spawn, tpool
+
+
+class PoolFull(Exception):
+    pass
+
+
+class WorkerPool:
+
+    def __init__(self, name, size=4, max_queue=64):
+        self.name = name
+        self.size = size
+        self.max_queue = max_queue
+        self._slots = semaphore.Semaphore(size)
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def run(self, fn, *args, **kwargs):
+        """Exécute `fn` hors du hub et renvoie son résultat ; PoolFull si saturé."""
+        self._reserve()
+        try:
+            return self._execute(fn, *args, **kwargs)
+        finally:
+            self.pending -= 1
+
+    def submit(self, fn, *args, **kwargs):
+        """Comme run(), sans attendre le résultat."""
+        # Place prise avant spawn : une rafale d'appels dans le même tour du hub est bornée aussi
+        self._reserve()
+        return spawn(self._run_logged, fn, *args, **kwargs)
+
+    def _reserve(self):
+        if self.pending >= self.size + self.max_queue:
+            self.rejected += 1
+            raise PoolFull(self.name)
+        self.pending += 1
+
+    def _execute(self, fn, *args, **kwargs):
+        try:
+            with self._slots:
+                return tpool.execute(fn, *args, **kwargs)
+        finally:
+            self.completed += 1
+
+    def _run_logged(self, fn, *args, **kwargs):
+        try:
+            return self._execute(fn, *args, **kwargs)
+        except Exception as e:
+            print(f"Erreur tâche {self.name} : {e}")
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'max_queue': self.max_queue,
+            'pending': self.pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }